@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+import main as game
+
+PHASES = ("input", "update", "collision", "render", "flip")
+ITEM_TYPES = ("fishbone", "dogbone", "chicken", "seaweed", "honey", "berries")
+NPC_TYPES = (
+    ("pitbull", "pitbull.png"),
+    ("poodle", "poodle.png"),
+    ("chick", "chick.png"),
+    ("whale", "blueywhale.png"),
+    ("bear", "bear.png"),
+    ("beaver", "Beaver.png")
+)
+MOVE_KEYS = (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_DOWN)
+NPC_BEHAVIORS = ("idle", "wander", "follow")
+BENCH_MAZE = 1000
+
+def generate_maze(width, height, seed, wall_chance=0.12, water_chance=0.04):
+    rng = random.Random(seed)
+    rows = ["X" * width]
+    for _ in range(height - 2):
+        row = ["X"]
+        for _ in range(width - 2):
+            roll = rng.random()
+            if roll < wall_chance:
+                row.append("X")
+            elif roll < wall_chance + water_chance:
+                row.append("W")
+            else:
+                row.append(rng.choice("PPPPI"))
+        row.append("X")
+        rows.append("".join(row))
+    rows.append("X" * width)
+    return rows
+
+def open_tiles(rows, count, rng):
+    tiles = []
+    while len(tiles) < count:
+        x = rng.randrange(1, len(rows[0]) - 1)
+        y = rng.randrange(1, len(rows) - 1)
+        if rows[y][x] in "PI":
+            tiles.append((x, y))
+    return tiles
+
+def generate_session(ticks, seed):
+    rng = random.Random(seed)
+    events = []
+    held = None
+    tick = 0
+    while tick < ticks:
+        if held is not None:
+            events.append((tick, pygame.KEYUP, held))
+        held = rng.choice(MOVE_KEYS)
+        events.append((tick, pygame.KEYDOWN, held))
+        if rng.random() < 0.1:
+            events.append((tick, pygame.KEYDOWN, pygame.K_e))
+            events.append((tick, pygame.KEYUP, pygame.K_e))
+            events.append((tick + 1, pygame.KEYDOWN, pygame.K_RETURN))
+            events.append((tick + 1, pygame.KEYUP, pygame.K_RETURN))
+        tick += rng.randrange(10, 90)
+    return game.InputReplay(events, ticks)
+
+def setup_scenario(size, entities, seed):
+    rng = random.Random(seed)
+    rows = generate_maze(size, size, seed)
+    tilemap = game.TileMap(rows)
+    game.tilemaps[BENCH_MAZE] = tilemap
+
+    for item in game.player.inventory:
+        game.player.inventory[item] = 0
+    game.quest_board = game.QuestBoard(game.player.inventory)
+
+    npc_count = max(1, entities // 10)
+    spots = open_tiles(rows, entities + npc_count + 1, rng)
+    for x, y in spots[:entities]:
+        tilemap.collectibles.insert(game.Collectible(x, y, rng.choice(ITEM_TYPES), BENCH_MAZE))
+    for x, y in spots[entities:entities + npc_count]:
+        npc_type, image = rng.choice(NPC_TYPES)
+        npc = game.NPC(x, y, os.path.join("assets", image), npc_type, BENCH_MAZE, behavior=rng.choice(NPC_BEHAVIORS))
+        tilemap.npcs.insert(npc)
+        game.quest_board.register(npc)
+
+    start_x, start_y = spots[-1]
+    game.player.rect.topleft = (start_x * game.TILE_SIZE, start_y * game.TILE_SIZE)
+    game.player.previous = game.player.rect.topleft
+    game.player.current_maze = BENCH_MAZE
+    game.player.portal_cooldown = 0.0
+    game.camera.width = tilemap.width
+    game.camera.height = tilemap.height
+    game.held_keys.clear()
+    game.in_dialogue = False
+    game.current_npc = None
+    game.tick_count = 0
+    game.dirty_tracker.reset()
+
+def timed_collision(timings):
+    check_collision = game.check_collision
+    def wrapper(rect, current_maze):
+        start = time.perf_counter()
+        try:
+            return check_collision(rect, current_maze)
+        finally:
+            timings["collision"] += time.perf_counter() - start
+    return wrapper
+
+def run_scenario(size, entities, replay, seed):
+    setup_scenario(size, entities, seed)
+    timings = dict.fromkeys(PHASES, 0.0)
+    check_collision = game.check_collision
+    game.check_collision = timed_collision(timings)
+    try:
+        for _ in range(replay.ticks):
+            start = time.perf_counter()
+            for event in replay.events_for(game.tick_count):
+                game.handle_event(event)
+            after_input = time.perf_counter()
+            collision_before = timings["collision"]
+            game.update(game.TICK)
+            after_update = time.perf_counter()
+            dirty = game.draw_frame(game.tilemaps[game.player.current_maze])
+            after_render = time.perf_counter()
+            game.present(dirty)
+            after_flip = time.perf_counter()
+
+            timings["input"] += after_input - start
+            timings["update"] += after_update - after_input - (timings["collision"] - collision_before)
+            timings["render"] += after_render - after_update
+            timings["flip"] += after_flip - after_render
+    finally:
+        game.check_collision = check_collision
+        game.entities.remove_maze(BENCH_MAZE)
+        del game.tilemaps[BENCH_MAZE]
+
+    total = sum(timings.values())
+    return {
+        "size": size,
+        "entities": entities,
+        "ticks": replay.ticks,
+        "ms_per_tick": {phase: timings[phase] * 1000 / replay.ticks for phase in PHASES},
+        "total_ms_per_tick": total * 1000 / replay.ticks,
+        "ticks_per_second": replay.ticks / total if total else 0.0
+    }
+
+def print_results(results):
+    header = f"{'size':>6} {'entities':>9} " + " ".join(f"{phase:>9}" for phase in PHASES) + f" {'total':>9} {'ticks/s':>9}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        phases = " ".join(f"{result['ms_per_tick'][phase]:9.3f}" for phase in PHASES)
+        print(f"{result['size']:>6} {result['entities']:>9} {phases} {result['total_ms_per_tick']:9.3f} {result['ticks_per_second']:9.0f}")
+    print("(timings are milliseconds per tick)")
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Replay an input session across generated maps and report per-phase timings.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[32, 128, 512, 1024], help="square map sizes in tiles")
+    parser.add_argument("--entities", type=int, nargs="+", default=[100, 1000, 10000], help="collectible counts per map")
+    parser.add_argument("--ticks", type=int, default=600, help="ticks to simulate when no replay is given")
+    parser.add_argument("--replay", help="input recording made with RECORD_INPUT=<path> python main.py")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    game.asset_tasks.drain()
+    replay = game.InputReplay.load(args.replay) if args.replay else generate_session(args.ticks, args.seed)
+    results = []
+    for size in args.sizes:
+        for entities in args.entities:
+            if entities > size * size // 4:
+                continue
+            results.append(run_scenario(size, entities, replay, args.seed))
+    print_results(results)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+    pygame.quit()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+def run_once(window):
+    env = dict(os.environ, STARTUP_BENCH="1", NO_SAVE="1")
+    if not window:
+        env.setdefault("SDL_VIDEODRIVER", "dummy")
+        env.setdefault("SDL_AUDIODRIVER", "dummy")
+    start = time.time()
+    process = subprocess.Popen([sys.executable, "main.py"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                               env=env, stdout=subprocess.PIPE, text=True)
+    marks = {}
+    for line in process.stdout:
+        if line.startswith("{"):
+            marks.update(json.loads(line))
+    process.wait()
+    if "first_frame" not in marks or "assets_loaded" not in marks:
+        raise RuntimeError(f"main.py exited with {process.returncode} before reporting startup timings")
+    return {name: (moment - start) * 1000 for name, moment in marks.items()}
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Measure time to first frame and to fully loaded assets.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--window", action="store_true", help="open a real window instead of the dummy video driver")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    runs = [run_once(args.window) for _ in range(args.runs)]
+    results = {}
+    print(f"{'milestone':>14} {'median':>9} {'min':>9} {'max':>9}")
+    for name in ("first_frame", "assets_loaded"):
+        values = [run[name] for run in runs]
+        results[name] = {"median": statistics.median(values), "min": min(values), "max": max(values)}
+        print(f"{name:>14} {results[name]['median']:9.1f} {results[name]['min']:9.1f} {results[name]['max']:9.1f}")
+    print(f"(milliseconds from process start over {args.runs} runs)")
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"runs": runs, "summary": results}, f, indent=2)
+
+if __name__ == "__main__":
+    sys.exit(main())
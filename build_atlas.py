@@ -0,0 +1,49 @@
+import pygame
+import os
+import sys
+import json
+import math
+
+TILE_SIZE = 32
+ASSET_DIR = "assets"
+ATLAS_IMAGE = os.path.join(ASSET_DIR, "atlas.png")
+ATLAS_MANIFEST = os.path.join(ASSET_DIR, "atlas.json")
+
+def find_images(asset_dir):
+    paths = []
+    for root, dirs, files in os.walk(asset_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if name.lower().endswith(".png") and os.path.abspath(path) != os.path.abspath(ATLAS_IMAGE):
+                paths.append(path)
+    return paths
+
+def build_atlas(asset_dir=ASSET_DIR, tile_size=TILE_SIZE):
+    paths = find_images(asset_dir)
+    columns = max(1, math.ceil(math.sqrt(len(paths))))
+    rows = max(1, math.ceil(len(paths) / columns))
+    atlas = pygame.Surface((columns*tile_size, rows*tile_size), pygame.SRCALPHA)
+    regions = {}
+
+    for i, path in enumerate(paths):
+        image = pygame.transform.scale(pygame.image.load(path), (tile_size, tile_size))
+        x = (i % columns) * tile_size
+        y = (i // columns) * tile_size
+        atlas.blit(image, (x, y))
+        key = os.path.relpath(path, asset_dir).replace(os.sep, "/")
+        regions[key] = [x, y, tile_size, tile_size]
+
+    return atlas, {"tile_size": tile_size, "images": regions}
+
+def main():
+    pygame.init()
+    atlas, manifest = build_atlas()
+    pygame.image.save(atlas, ATLAS_IMAGE)
+    with open(ATLAS_MANIFEST, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    print(f"Packed {len(manifest['images'])} images into {ATLAS_IMAGE}")
+    pygame.quit()
+
+if __name__ == "__main__":
+    sys.exit(main())
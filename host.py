@@ -0,0 +1,110 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault("HEADLESS", "1")
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+import main as game
+from bench import generate_session
+
+STEP_TICKS = 60
+
+def load_jobs(args):
+    jobs = []
+    for path in args.replays:
+        jobs.append({"name": path, "replay": path, "seed": None, "ticks": None, "claimed": None})
+    if args.claims:
+        with open(args.claims) as f:
+            for claim in json.load(f):
+                jobs.append({"name": claim["replay"], "replay": claim["replay"], "seed": None, "ticks": None,
+                             "claimed": sorted(claim["quests"])})
+    for i in range(args.bots):
+        seed = args.seed + i
+        jobs.append({"name": f"bot-{seed}", "replay": None, "seed": seed, "ticks": args.ticks, "claimed": None})
+    return jobs
+
+async def run_session(job, step_ticks):
+    if job["replay"] is not None:
+        replay = game.InputReplay.load(job["replay"])
+    else:
+        replay = generate_session(job["ticks"], job["seed"])
+    session = game.GameSession()
+    while session.tick_count < replay.ticks:
+        session.run(min(step_ticks, replay.ticks - session.tick_count), replay)
+        await asyncio.sleep(0)
+    result = session.summary()
+    result["name"] = job["name"]
+    if job["claimed"] is not None:
+        result["claimed"] = job["claimed"]
+        result["valid"] = job["claimed"] == result["quests"]
+    return result
+
+async def run_sessions(jobs, step_ticks):
+    return await asyncio.gather(*(run_session(job, step_ticks) for job in jobs))
+
+def run_batch(jobs, step_ticks):
+    results = asyncio.run(run_sessions(jobs, step_ticks))
+    pygame.quit()
+    return results
+
+async def run_pool(jobs, step_ticks, workers):
+    loop = asyncio.get_running_loop()
+    batches = [jobs[i::workers] for i in range(workers)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        done = await asyncio.gather(*(loop.run_in_executor(pool, run_batch, batch, step_ticks) for batch in batches if batch))
+    return [result for batch in done for result in batch]
+
+def print_results(results, elapsed):
+    ticks = sum(result["ticks"] for result in results)
+    quests = {}
+    for result in results:
+        for quest in result["quests"]:
+            quests[quest] = quests.get(quest, 0) + 1
+    print(f"{len(results)} sessions, {ticks} ticks in {elapsed:.3f}s ({ticks / max(elapsed, 1e-9):.0f} ticks/s)")
+    for quest in sorted(quests):
+        print(f"  {quest:>10}: completed in {quests[quest]} sessions")
+    for result in results:
+        if "valid" in result:
+            status = "valid" if result["valid"] else f"MISMATCH (replay completed {result['quests']})"
+            print(f"  {result['name']}: claimed {result['claimed']} -> {status}")
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Run many headless game sessions from scripted or recorded inputs.")
+    parser.add_argument("--bots", type=int, default=0, help="scripted bot sessions to run")
+    parser.add_argument("--ticks", type=int, default=3600, help="ticks per bot session")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the first bot session")
+    parser.add_argument("replays", nargs="*", help="input recordings made with RECORD_INPUT=<path> python main.py")
+    parser.add_argument("--claims", help="JSON list of {\"replay\": path, \"quests\": [...]} to validate")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (0 runs everything in this process)")
+    parser.add_argument("--step", type=int, default=STEP_TICKS, help="ticks a session runs before yielding")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    jobs = load_jobs(args)
+    if not jobs:
+        print("nothing to run: pass --bots, replays or --claims")
+        return 2
+    start = time.perf_counter()
+    if args.workers > 0:
+        results = asyncio.run(run_pool(jobs, args.step, args.workers))
+    else:
+        results = asyncio.run(run_sessions(jobs, args.step))
+    elapsed = time.perf_counter() - start
+    print_results(results, elapsed)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+    pygame.quit()
+    return 1 if any(result.get("valid") is False for result in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,22 +2,126 @@ import pygame
 import sys
 import os
 import asyncio
+import time
+import json
+import numpy as np
+import heapq
+import struct
+import zlib
+import random
+import math
+from itertools import repeat
+from collections import OrderedDict, deque, namedtuple
+from types import MappingProxyType
 
-pygame.init()
+HEADLESS = os.environ.get("HEADLESS") == "1"
+HEADLESS_TICKS = int(os.environ.get("HEADLESS_TICKS", "36000"))
+RECORD_INPUT = os.environ.get("RECORD_INPUT")
+REPLAY_INPUT = os.environ.get("REPLAY_INPUT")
+INPUT_FORMAT_VERSION = 1
+PROFILE = os.environ.get("PROFILE") == "1"
+PROFILE_OUTPUT = os.environ.get("PROFILE_OUTPUT")
+STARTUP_BENCH = os.environ.get("STARTUP_BENCH") == "1"
+SAVE_ENABLED = not (HEADLESS or RECORD_INPUT or REPLAY_INPUT) and os.environ.get("NO_SAVE") != "1"
+FOG_OF_WAR = os.environ.get("NO_FOG") != "1"
+DIRTY_RECT_RENDERING = os.environ.get("DIRTY_RECTS") == "1"
+SAVE_DIR = os.environ.get("SAVE_DIR", "/saves" if sys.platform == "emscripten" else "saves")
+if HEADLESS:
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+pygame.display.init()
+pygame.font.init()
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
 TILE_SIZE = 32
-PLAYER_SPEED = 4
+FPS = 60
+TICK_RATE = 60
+TICK = 1 / TICK_RATE
+MAX_FRAME_TIME = 0.25
+PLAYER_SPEED = 240
+PORTAL_COOLDOWN = 1.0
+CHUNK_SIZE = 16
+MAX_CACHED_CHUNKS = 64
+FLAG_CHUNKS_PER_STEP = 16
+TASK_BUDGET = 0.004
+PREFETCH_DISTANCE = 6
+PRIORITY_ATLAS = 0
+PRIORITY_PLAYER = 1
+PRIORITY_TILES = 2
+PRIORITY_SPRITES = 3
+PRIORITY_LEVEL = 10
+SPATIAL_CELL_SIZE = TILE_SIZE * 4
+MAX_CACHED_TEXT = 256
+PROFILE_HISTORY = 240
+PROFILE_EXPORT_FRAMES = 36000
+PROFILE_OVERLAY_REFRESH = 0.25
+PROFILE_OVERLAY_WIDTH = 260
+PROFILE_HISTOGRAM_BUCKETS = 24
+NPC_SPEED = 120
+NPC_SIM_MARGIN = TILE_SIZE * 4
+WANDER_RADIUS = 6
+WANDER_PAUSE = 1.5
+FLOW_FIELD_RADIUS = 32
+MAX_CACHED_FLOW_FIELDS = 32
+PATH_MAX_NODES = 4096
+NEIGHBOURS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+VIEW_RADIUS = 8
+MAX_CACHED_VIEWS = 256
+FOG_EXPLORED = 150
+FOG_UNEXPLORED = 255
+ENTITY_CAPACITY = 1024
+KIND_NPC = 1
+KIND_COLLECTIBLE = 2
+KNOCKBACK_SPEED = 360
+DRIFT_DRAG = 0.002
+DRIFT_STOP_SPEED = 20
+PARTICLE_CAPACITY = 4096
+PARTICLE_RADIUS = 3
+PARTICLE_FADE_STEPS = 8
+PARTICLE_DRAG = 0.15
+PICKUP_COLOR = (255, 215, 90)
+PORTAL_COLOR = (170, 110, 255)
+QUEST_COLORS = ((120, 255, 120), (255, 215, 90), (255, 140, 200))
+SAVE_MAGIC = b"CATS"
+SAVE_VERSION = 2
+AUTOSAVE_INTERVAL = 10.0
+AUTOSAVE_COMPACT_RECORDS = 30
+IDBFS_MOUNT_JS = """
+(function (dir) {
+    try { FS.mkdir(dir); } catch (e) {}
+    try { FS.mount(FS.filesystems.IDBFS, {}, dir); } catch (e) {}
+    window.cat_save_ready = false;
+    FS.syncfs(true, function (err) { window.cat_save_ready = true; });
+})("%s");
+"""
+WALK_FRAME_TIME = 10 / 60
+ATLAS_IMAGE = os.path.join("assets", "atlas.png")
+ATLAS_MANIFEST = os.path.join("assets", "atlas.json")
+DIALOGUE_DATA = os.path.join("assets", "dialogues.json")
+EMPTY_CHUNK = b" " * (CHUNK_SIZE * CHUNK_SIZE)
 screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+SCREEN_RECT = screen.get_rect()
 pygame.display.set_caption("Cute Cat Adventure")
 clock = pygame.time.Clock()
 font = pygame.font.Font(None, 32)
 
 DIALOGUE_BG = (50, 50, 50, 200)
+DIALOGUE_HEIGHT = 200
 WHITE = (255, 255, 255)
 GREEN = (0, 255, 0)
 BLACK = (0, 0, 0)
 
+SOLID = 1
+WATER = 2
+PORTAL = 4
+ICE = 8
+OPAQUE = 16
+TILE_FLAGS = np.zeros(256, dtype=np.uint8)
+TILE_FLAGS[ord('X')] = SOLID | OPAQUE
+TILE_FLAGS[ord('W')] = SOLID | WATER
+TILE_FLAGS[ord('T')] = PORTAL
+TILE_FLAGS[ord('I')] = ICE
+
 class Camera:
     def __init__(self, width, height):
         self.camera = pygame.Rect(0, 0, width, height)
@@ -28,9 +132,13 @@ class Camera:
         target_rect = entity if isinstance(entity, pygame.Rect) else entity.rect
         return target_rect.move(self.camera.topleft)
 
+    def view(self):
+        return pygame.Rect(-self.camera.x, -self.camera.y, SCREEN_WIDTH, SCREEN_HEIGHT)
+
     def update(self, target):
-        x = -target.rect.centerx + int(SCREEN_WIDTH / 2)
-        y = -target.rect.centery + int(SCREEN_HEIGHT / 2)
+        target_rect = target if isinstance(target, pygame.Rect) else target.rect
+        x = -target_rect.centerx + int(SCREEN_WIDTH / 2)
+        y = -target_rect.centery + int(SCREEN_HEIGHT / 2)
 
         x = min(0, x)
         y = min(0, y)
@@ -39,25 +147,144 @@ class Camera:
 
         self.camera = pygame.Rect(x, y, self.width, self.height)
 
-        current_maze = MAZE2 if player.current_maze == 2 else MAZE1
-        for y, row in enumerate(current_maze):
-            for x, char in enumerate(row):
-                if char in tile_images:
-                    tile_rect = pygame.Rect(x*TILE_SIZE, y*TILE_SIZE, TILE_SIZE, TILE_SIZE)
-                    screen.blit(tile_images[char], camera.apply(tile_rect).topleft)
+class TaskQueue:
+    def __init__(self):
+        self.heap = []
+        self.keys = set()
+        self.order = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def submit(self, task, key=None, priority=0):
+        if key is not None:
+            if key in self.keys:
+                return False
+            self.keys.add(key)
+        heapq.heappush(self.heap, (priority, self.order, key, task))
+        self.order += 1
+        return True
+
+    def run(self, budget):
+        deadline = time.perf_counter() + budget
+        while self.heap:
+            priority, order, key, task = self.heap[0]
+            try:
+                next(task)
+            except StopIteration:
+                heapq.heappop(self.heap)
+                self.keys.discard(key)
+            if time.perf_counter() >= deadline:
+                break
+
+    def drain(self):
+        while self.heap:
+            self.run(float("inf"))
+
+asset_tasks = TaskQueue()
+
+asset_generation = 0
+
+def load_pixels(target, path, scale):
+    global asset_generation
+    image = pygame.image.load(path).convert_alpha()
+    if scale:
+        image = pygame.transform.scale(image, target.get_size())
+    target.fill((0, 0, 0, 0))
+    target.blit(image, (0, 0), special_flags=pygame.BLEND_RGBA_ADD)
+    asset_generation += 1
+    yield
+
+def load_atlas():
+    if not (os.path.exists(ATLAS_IMAGE) and os.path.exists(ATLAS_MANIFEST)):
+        return None, {}
+    with open(ATLAS_MANIFEST) as f:
+        manifest = json.load(f)
+    if manifest.get("tile_size") != TILE_SIZE:
+        return None, {}
+    regions = manifest["images"]
+    width = max(x + w for x, y, w, h in regions.values())
+    height = max(y + h for x, y, w, h in regions.values())
+    atlas = pygame.Surface((width, height), pygame.SRCALPHA)
+    asset_tasks.submit(load_pixels(atlas, ATLAS_IMAGE, False), key=("image", ATLAS_IMAGE), priority=PRIORITY_ATLAS)
+    return atlas, regions
+
+atlas, atlas_regions = load_atlas()
+image_cache = {}
+
+def load_image(path, priority=PRIORITY_SPRITES, placeholder=None):
+    key = os.path.relpath(path, "assets").replace(os.sep, "/")
+    image = image_cache.get(key)
+    if image is None:
+        if key in atlas_regions:
+            image = atlas.subsurface(pygame.Rect(atlas_regions[key]))
+            if placeholder is not None and ("image", ATLAS_IMAGE) in asset_tasks:
+                image.fill(placeholder)
+        else:
+            image = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
+            if os.path.exists(path):
+                if placeholder is not None:
+                    image.fill(placeholder)
+                asset_tasks.submit(load_pixels(image, path, True), key=("image", key), priority=priority)
+        image_cache[key] = image
+    return image
+
+class Animation:
+    def __init__(self, frames, frame_time=WALK_FRAME_TIME):
+        self.images = frames
+        self.frame_time = frame_time
+        self.generation = None
+
+    def frame(self, elapsed, flipped=False):
+        if self.generation != asset_generation:
+            self.frames = [(frame, pygame.transform.flip(frame, True, False)) for frame in self.images]
+            self.generation = asset_generation
+        index = int(elapsed / self.frame_time) % len(self.frames)
+        return self.frames[index][flipped]
+
+static_animations = {}
 
-def load_image(path):
-    if os.path.exists(path):
-        img = pygame.image.load(path).convert_alpha()
-        return pygame.transform.scale(img, (TILE_SIZE, TILE_SIZE))
-    return pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
+def static_animation(image):
+    animation = static_animations.get(image)
+    if animation is None:
+        animation = static_animations[image] = Animation([image])
+    return animation
+
+class Sprite:
+    def __init__(self, animations, state):
+        self.animations = animations
+        self.state = state
+        self.elapsed = 0.0
+
+    @classmethod
+    def static(cls, image):
+        return cls({"idle": static_animation(image)}, "idle")
+
+    def play(self, state):
+        if state != self.state:
+            self.state = state
+            self.elapsed = 0.0
+
+    def update(self, dt):
+        self.elapsed += dt
+
+    def image(self, flipped=False):
+        return self.animations[self.state].frame(self.elapsed, flipped)
 
 cat_anim = [
-    load_image(os.path.join("assets", "Cat", "idle.png")),
-    load_image(os.path.join("assets", "Cat", "0.png")),
-    load_image(os.path.join("assets", "Cat", "1.png"))
+    load_image(os.path.join("assets", "Cat", "idle.png"), PRIORITY_PLAYER),
+    load_image(os.path.join("assets", "Cat", "0.png"), PRIORITY_PLAYER),
+    load_image(os.path.join("assets", "Cat", "1.png"), PRIORITY_PLAYER)
 ]
 
+cat_animations = {
+    "idle": Animation(cat_anim[:1]),
+    "walk": Animation(cat_anim[1:])
+}
+
 collectible_images = {
     'fish': load_image(os.path.join("assets", "catfood0.png")),
     'fishbone': load_image(os.path.join("assets", "fishbone.png")),
@@ -69,11 +296,11 @@ collectible_images = {
 }
 
 tile_images = {
-    'X': load_image(os.path.join("assets", "map", "wall.png")),
-    'W': load_image(os.path.join("assets", "map", "water.png")),
-    'I': load_image(os.path.join("assets", "map", "ice.png")),
-    'P': load_image(os.path.join("assets", "map", "path.png")),
-    'T': load_image(os.path.join("assets", "map", "portal.png"))
+    'X': load_image(os.path.join("assets", "map", "wall.png"), PRIORITY_TILES, (110, 110, 110)),
+    'W': load_image(os.path.join("assets", "map", "water.png"), PRIORITY_TILES, (110, 170, 170)),
+    'I': load_image(os.path.join("assets", "map", "ice.png"), PRIORITY_TILES, (200, 230, 240)),
+    'P': load_image(os.path.join("assets", "map", "path.png"), PRIORITY_TILES, (200, 195, 190)),
+    'T': load_image(os.path.join("assets", "map", "portal.png"), PRIORITY_TILES, (150, 90, 200))
 }
 
 MAZE1 = [
@@ -108,11 +335,632 @@ MAZE2 = [
     "XXXXXXXXXXXXXXXXXXXXXXXXX",
 ]
 
+class TextCache:
+    def __init__(self, max_size=MAX_CACHED_TEXT):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+
+    def render(self, text, color, text_font=None):
+        text_font = text_font or font
+        key = (text, color, text_font)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.surfaces[key] = text_font.render(text, True, color)
+            if len(self.surfaces) > self.max_size:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surface
+
+class CachedPanel:
+    def __init__(self, build):
+        self.build = build
+        self.key = None
+        self.surface = None
+
+    def get(self, key):
+        if self.surface is None or key != self.key:
+            self.key = key
+            self.surface = self.build(*key)
+        return self.surface
+
+text_cache = TextCache()
+
+class NullSection:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_SECTION = NullSection()
+
+class ProfileSection:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+        return False
+
+class Profiler:
+    def __init__(self, recording=False, show_overlay=False, history=PROFILE_HISTORY):
+        self.recording = recording
+        self.show_overlay = show_overlay
+        self.enabled = recording or show_overlay
+        self.sections = {}
+        self.current = {}
+        self.frame_times = deque(maxlen=history)
+        self.phase_times = {}
+        self.records = deque(maxlen=PROFILE_EXPORT_FRAMES)
+        self.frame_start = None
+        self.overlay = None
+        self.overlay_time = 0.0
+
+    def section(self, name):
+        if not self.enabled:
+            return NULL_SECTION
+        section = self.sections.get(name)
+        if section is None:
+            section = self.sections[name] = ProfileSection(self, name)
+        return section
+
+    def add(self, name, elapsed):
+        self.current[name] = self.current.get(name, 0.0) + elapsed
+
+    def toggle(self):
+        self.show_overlay = not self.show_overlay
+        if self.enabled != (self.recording or self.show_overlay):
+            self.enabled = not self.enabled
+            self.frame_start = None
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            frame_time = now - self.frame_start
+            self.frame_times.append(frame_time)
+            for name, elapsed in self.current.items():
+                self.phase_times.setdefault(name, deque(maxlen=self.frame_times.maxlen)).append(elapsed)
+            self.records.append((frame_time, dict(self.current)))
+        self.frame_start = now
+        self.current = {}
+
+    def percentile(self, fraction):
+        if not self.frame_times:
+            return 0.0
+        ordered = sorted(self.frame_times)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def stats(self):
+        mean = sum(self.frame_times) / len(self.frame_times) if self.frame_times else 0.0
+        phases = {name: sum(times) / len(times) for name, times in self.phase_times.items() if times}
+        return {
+            "fps": 1 / mean if mean else 0.0,
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+            "phases": phases
+        }
+
+    def overlay_surface(self):
+        now = time.perf_counter()
+        if self.overlay is None or now - self.overlay_time >= PROFILE_OVERLAY_REFRESH:
+            self.overlay = self.build_overlay()
+            self.overlay_time = now
+        return self.overlay
+
+    def build_overlay(self):
+        stats = self.stats()
+        lines = [
+            f"FPS {stats['fps']:.0f}",
+            f"p50 {stats['p50']*1000:.2f} ms  p99 {stats['p99']*1000:.2f} ms"
+        ]
+        for name, elapsed in sorted(stats["phases"].items(), key=lambda item: -item[1]):
+            lines.append(f"{name:<10} {elapsed*1000:6.2f} ms")
+
+        line_height = 18
+        graph_height = 40
+        overlay = pygame.Surface((PROFILE_OVERLAY_WIDTH, 10 + len(lines)*line_height + graph_height + 10), pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 170))
+        for i, line in enumerate(lines):
+            overlay.blit(text_cache.render(line, WHITE, profiler_font), (8, 6 + i*line_height))
+
+        graph_top = 10 + len(lines)*line_height
+        graph_bottom = graph_top + graph_height
+        bar_width = (PROFILE_OVERLAY_WIDTH - 16) // PROFILE_HISTOGRAM_BUCKETS
+        budget = 1 / FPS
+        edges = np.linspace(0, 2 * budget, PROFILE_HISTOGRAM_BUCKETS + 1)
+        frame_times = np.minimum(np.fromiter(self.frame_times, dtype=float), edges[-1])
+        counts, edges = np.histogram(frame_times, bins=edges)
+        tallest = max(counts.max(), 1)
+        for i, count in enumerate(counts.tolist()):
+            height = graph_height * count // tallest
+            color = GREEN if edges[i + 1] <= budget else (255, 80, 80)
+            overlay.fill(color, (8 + i*bar_width, graph_bottom - height, bar_width - 1, height))
+        budget_x = 8 + bar_width * PROFILE_HISTOGRAM_BUCKETS // 2
+        pygame.draw.line(overlay, WHITE, (budget_x, graph_top), (budget_x, graph_bottom))
+        return overlay
+
+    def export(self, path):
+        names = sorted({name for frame_time, phases in self.records for name in phases})
+        with open(path, "w") as f:
+            f.write(",".join(["frame", "frame_ms"] + [f"{name}_ms" for name in names]) + "\n")
+            for i, (frame_time, phases) in enumerate(self.records):
+                values = [str(i), f"{frame_time*1000:.4f}"] + [f"{phases.get(name, 0.0)*1000:.4f}" for name in names]
+                f.write(",".join(values) + "\n")
+
+profiler_font = pygame.font.Font(None, 20)
+profiler = Profiler(PROFILE or bool(PROFILE_OUTPUT), PROFILE)
+
+class SpatialHash:
+    def __init__(self, cell_size=SPATIAL_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.entries = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(list(self.entries))
+
+    def __contains__(self, entity):
+        return entity in self.entries
+
+    def cell_keys(self, rect):
+        size = self.cell_size
+        return tuple((x, y)
+                     for y in range(rect.top // size, (rect.bottom - 1) // size + 1)
+                     for x in range(rect.left // size, (rect.right - 1) // size + 1))
+
+    def insert(self, entity):
+        keys = self.cell_keys(entity.rect)
+        self.entries[entity] = keys
+        for key in keys:
+            self.cells.setdefault(key, {})[entity] = None
+
+    def remove(self, entity):
+        for key in self.entries.pop(entity):
+            cell = self.cells[key]
+            del cell[entity]
+            if not cell:
+                del self.cells[key]
+
+    def move(self, entity):
+        if self.cell_keys(entity.rect) != self.entries.get(entity):
+            self.remove(entity)
+            self.insert(entity)
+
+    def query(self, rect):
+        found = {}
+        for key in self.cell_keys(rect):
+            cell = self.cells.get(key)
+            if cell:
+                found.update(cell)
+        return [entity for entity in found if rect.colliderect(entity.rect)]
+
+class FlowField:
+    def __init__(self, goal, left, top, width, height, distances):
+        self.goal = goal
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+        self.distances = distances
+
+    def distance(self, tile):
+        x = tile[0] - self.left
+        y = tile[1] - self.top
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.distances[y*self.width + x]
+        return -1
+
+    def next_step(self, tile):
+        best = None
+        best_distance = self.distance(tile)
+        for dx, dy in NEIGHBOURS:
+            neighbour = (tile[0] + dx, tile[1] + dy)
+            distance = self.distance(neighbour)
+            if distance >= 0 and (best_distance < 0 or distance < best_distance):
+                best = neighbour
+                best_distance = distance
+        return best
+
+class Pathfinder:
+    def __init__(self, tilemap):
+        self.tilemap = tilemap
+        self.version = None
+        self.walkable = b""
+        self.cols = 0
+        self.rows = 0
+        self.fields = OrderedDict()
+
+    def refresh(self):
+        if self.version != self.tilemap.version:
+            flags = self.tilemap.flags
+            self.rows, self.cols = flags.shape
+            self.walkable = ((flags & SOLID) == 0).astype(np.uint8).tobytes()
+            self.fields.clear()
+            self.version = self.tilemap.version
+
+    def is_walkable(self, x, y):
+        return 0 <= x < self.cols and 0 <= y < self.rows and self.walkable[y*self.cols + x]
+
+    def find_path(self, start, goal, max_nodes=PATH_MAX_NODES):
+        self.refresh()
+        if not self.is_walkable(*goal):
+            return None
+        open_heap = [(0, 0, start)]
+        came_from = {start: None}
+        costs = {start: 0}
+        expanded = 0
+        while open_heap:
+            priority, cost, current = heapq.heappop(open_heap)
+            if current == goal:
+                path = []
+                while current != start:
+                    path.append(current)
+                    current = came_from[current]
+                path.reverse()
+                return path
+            if cost > costs[current]:
+                continue
+            expanded += 1
+            if expanded > max_nodes:
+                break
+            for dx, dy in NEIGHBOURS:
+                neighbour = (current[0] + dx, current[1] + dy)
+                if not self.is_walkable(*neighbour):
+                    continue
+                new_cost = cost + 1
+                if new_cost < costs.get(neighbour, new_cost + 1):
+                    costs[neighbour] = new_cost
+                    came_from[neighbour] = current
+                    estimate = abs(goal[0] - neighbour[0]) + abs(goal[1] - neighbour[1])
+                    heapq.heappush(open_heap, (new_cost + estimate, new_cost, neighbour))
+        return None
+
+    def flow_field(self, goal, radius=FLOW_FIELD_RADIUS):
+        self.refresh()
+        key = (goal, radius)
+        field = self.fields.get(key)
+        if field is not None:
+            self.fields.move_to_end(key)
+            return field
+
+        left = max(goal[0] - radius, 0)
+        top = max(goal[1] - radius, 0)
+        width = min(goal[0] + radius + 1, self.cols) - left
+        height = min(goal[1] + radius + 1, self.rows) - top
+        distances = [-1] * max(width * height, 0)
+        if 0 <= goal[0] - left < width and 0 <= goal[1] - top < height:
+            distances[(goal[1] - top)*width + goal[0] - left] = 0
+            frontier = deque([goal])
+            while frontier:
+                x, y = frontier.popleft()
+                distance = distances[(y - top)*width + x - left] + 1
+                for dx, dy in NEIGHBOURS:
+                    nx = x + dx
+                    ny = y + dy
+                    if left <= nx < left + width and top <= ny < top + height:
+                        index = (ny - top)*width + nx - left
+                        if distances[index] < 0 and self.walkable[ny*self.cols + nx]:
+                            distances[index] = distance
+                            frontier.append((nx, ny))
+
+        field = self.fields[key] = FlowField(goal, left, top, width, height, distances)
+        if len(self.fields) > MAX_CACHED_FLOW_FIELDS:
+            self.fields.popitem(last=False)
+        return field
+
+class FieldOfView:
+    def __init__(self, radius):
+        self.radius = radius
+        size = radius*2 + 1
+        dy, dx = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+        self.inside = dx*dx + dy*dy <= radius*radius
+        steps = np.arange(1, size*2) / (size*2)
+        self.ys = np.rint(dy[..., None] * steps).astype(np.intp) + radius
+        self.xs = np.rint(dx[..., None] * steps).astype(np.intp) + radius
+        target = (self.ys == dy[..., None] + radius) & (self.xs == dx[..., None] + radius)
+        self.ys[target] = radius
+        self.xs[target] = radius
+
+    def visible(self, opaque):
+        return self.inside & ~opaque[self.ys, self.xs].any(axis=2)
+
+field_of_view = FieldOfView(VIEW_RADIUS)
+
+class FogOfWar:
+    def __init__(self, tilemap):
+        self.tilemap = tilemap
+        self.version = None
+        self.views = OrderedDict()
+        self.explored = np.zeros((0, 0), dtype=np.uint8)
+        self.tile = None
+        self.revision = 0
+        self.key = None
+        self.tiles = None
+        self.surface = None
+        self.position = (0, 0)
+
+    def refresh(self):
+        if self.version != self.tilemap.version:
+            shape = (self.tilemap.row_count, (self.tilemap.cols + 7) // 8)
+            if self.explored.shape != shape:
+                explored = np.zeros(shape, dtype=np.uint8)
+                rows, cols = self.explored.shape
+                explored[:rows, :cols] = self.explored
+                self.explored = explored
+            self.views.clear()
+            self.tile = None
+            self.version = self.tilemap.version
+
+    def view_from(self, tile):
+        self.refresh()
+        view = self.views.get(tile)
+        if view is not None:
+            self.views.move_to_end(tile)
+            return view
+        radius = field_of_view.radius
+        x, y = tile
+        flags = self.tilemap.flags
+        left, top = max(x - radius, 0), max(y - radius, 0)
+        right, bottom = min(x + radius + 1, self.tilemap.cols), min(y + radius + 1, self.tilemap.row_count)
+        opaque = np.ones((radius*2 + 1, radius*2 + 1), dtype=bool)
+        opaque[top - y + radius:bottom - y + radius, left - x + radius:right - x + radius] = flags[top:bottom, left:right] & OPAQUE
+        opaque[radius, radius] = False
+        view = self.views[tile] = field_of_view.visible(opaque)
+        if len(self.views) > MAX_CACHED_VIEWS:
+            self.views.popitem(last=False)
+        return view
+
+    def window(self, left, top, width, height, shape):
+        right = min(left + width, shape[1])
+        bottom = min(top + height, shape[0])
+        clipped_left, clipped_top = max(left, 0), max(top, 0)
+        return (slice(clipped_top, bottom), slice(clipped_left, right),
+                slice(clipped_top - top, bottom - top), slice(clipped_left - left, right - left))
+
+    def restore(self, explored):
+        self.refresh()
+        rows = min(len(explored), self.explored.shape[0])
+        cols = min(explored.shape[1], self.explored.shape[1])
+        self.explored[:] = 0
+        self.explored[:rows, :cols] = explored[:rows, :cols]
+        self.tile = None
+        self.revision += 1
+
+    def explored_bits(self, rows, first, last):
+        return np.unpackbits(self.explored[rows, first:last], axis=1)
+
+    def update(self, tile):
+        self.refresh()
+        if tile == self.tile:
+            return
+        view = self.view_from(tile)
+        self.tile = tile
+        radius = field_of_view.radius
+        rows, cols, view_rows, view_cols = self.window(tile[0] - radius, tile[1] - radius, radius*2 + 1, radius*2 + 1,
+                                                       (self.tilemap.row_count, self.tilemap.cols))
+        first, last = cols.start // 8, (cols.stop + 7) // 8
+        bits = self.explored_bits(rows, first, last)
+        offset = cols.start - first*8
+        bits[:, offset:offset + cols.stop - cols.start] |= view[view_rows, view_cols]
+        self.explored[rows, first:last] = np.packbits(bits, axis=1)
+        self.revision += 1
+
+    def overlay(self, area):
+        left, top = area.x // TILE_SIZE, area.y // TILE_SIZE
+        cols, rows = area.width // TILE_SIZE + 2, area.height // TILE_SIZE + 2
+        key = (left, top, self.revision)
+        if key != self.key:
+            self.key = key
+            alpha = np.full((rows, cols), FOG_UNEXPLORED, dtype=np.uint8)
+            map_rows, map_cols, alpha_rows, alpha_cols = self.window(left, top, cols, rows, (self.tilemap.row_count, self.tilemap.cols))
+            if map_cols.stop > map_cols.start and map_rows.stop > map_rows.start:
+                first = map_cols.start // 8
+                bits = self.explored_bits(map_rows, first, (map_cols.stop + 7) // 8)
+                offset = map_cols.start - first*8
+                explored = bits[:, offset:offset + map_cols.stop - map_cols.start].astype(bool)
+                alpha[alpha_rows, alpha_cols][explored] = FOG_EXPLORED
+            if self.tile is not None:
+                radius = field_of_view.radius
+                alpha_rows, alpha_cols, view_rows, view_cols = self.window(
+                    self.tile[0] - radius - left, self.tile[1] - radius - top, radius*2 + 1, radius*2 + 1, alpha.shape)
+                view = self.view_from(self.tile)
+                alpha[alpha_rows, alpha_cols][view[view_rows, view_cols]] = 0
+
+            if self.tiles is None or self.tiles.get_size() != (cols, rows):
+                self.tiles = pygame.Surface((cols, rows), pygame.SRCALPHA)
+                self.tiles.fill((0, 0, 0, 255))
+                self.surface = pygame.Surface((cols*TILE_SIZE, rows*TILE_SIZE), pygame.SRCALPHA)
+            pixels = pygame.surfarray.pixels_alpha(self.tiles)
+            pixels[:] = alpha.T
+            del pixels
+            pygame.transform.scale(self.tiles, self.surface.get_size(), self.surface)
+            self.position = (left*TILE_SIZE, top*TILE_SIZE)
+        return self.surface, self.position
+
+class TileMap:
+    def __init__(self, rows):
+        self.cols = max(len(row) for row in rows)
+        self.row_count = len(rows)
+        self.width = self.cols * TILE_SIZE
+        self.height = self.row_count * TILE_SIZE
+        self.chunks = {}
+        self.surfaces = OrderedDict()
+        self.collectibles = SpatialHash()
+        self.npcs = SpatialHash()
+        self._flags = None
+        self._portals = None
+        self.version = 0
+        self.edits = []
+        self.original_tiles = {}
+        self.pathfinder = Pathfinder(self)
+        self.fog = FogOfWar(self)
+
+        for y, row in enumerate(rows):
+            cy, ty = divmod(y, CHUNK_SIZE)
+            for cx in range(0, (len(row) + CHUNK_SIZE - 1) // CHUNK_SIZE):
+                strip = row[cx*CHUNK_SIZE:(cx+1)*CHUNK_SIZE]
+                if not strip.strip():
+                    continue
+                chunk = self.chunks.get((cx, cy))
+                if chunk is None:
+                    chunk = self.chunks[(cx, cy)] = bytearray(EMPTY_CHUNK)
+                chunk[ty*CHUNK_SIZE:ty*CHUNK_SIZE + len(strip)] = strip.encode("ascii")
+
+    def get_tile(self, x, y):
+        chunk = self.chunks.get((x // CHUNK_SIZE, y // CHUNK_SIZE))
+        if chunk is None or x < 0 or y < 0:
+            return ' '
+        return chr(chunk[(y % CHUNK_SIZE)*CHUNK_SIZE + x % CHUNK_SIZE])
+
+    def set_tile(self, x, y, char):
+        if x < 0 or y < 0:
+            raise ValueError(f"Tile position out of range: {(x, y)}")
+        self.original_tiles.setdefault((x, y), self.get_tile(x, y))
+        key = (x // CHUNK_SIZE, y // CHUNK_SIZE)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self.chunks[key] = bytearray(EMPTY_CHUNK)
+        chunk[(y % CHUNK_SIZE)*CHUNK_SIZE + x % CHUNK_SIZE] = ord(char)
+        if x >= self.cols or y >= self.row_count:
+            self.cols = max(self.cols, x + 1)
+            self.row_count = max(self.row_count, y + 1)
+            self.width = self.cols * TILE_SIZE
+            self.height = self.row_count * TILE_SIZE
+            self._flags = None
+        elif self._flags is not None:
+            self._flags[y, x] = TILE_FLAGS[ord(char)]
+        self.surfaces.pop(key, None)
+        self.version += 1
+        self.edits.append((x, y, char))
+
+    def revert_edits(self):
+        for (x, y), char in self.original_tiles.items():
+            self.set_tile(x, y, char)
+        self.original_tiles.clear()
+        self.edits.clear()
+
+    @property
+    def flags(self):
+        if self._flags is None:
+            for _ in self.compile_flags():
+                pass
+        return self._flags
+
+    def compile_flags(self):
+        version = self.version
+        padded = np.zeros((-(-self.row_count // CHUNK_SIZE) * CHUNK_SIZE,
+                           -(-self.cols // CHUNK_SIZE) * CHUNK_SIZE), dtype=np.uint8)
+        for i, ((cx, cy), chunk) in enumerate(list(self.chunks.items())):
+            if cx < 0 or cy < 0:
+                continue
+            tiles = np.frombuffer(chunk, dtype=np.uint8).reshape(CHUNK_SIZE, CHUNK_SIZE)
+            padded[cy*CHUNK_SIZE:(cy+1)*CHUNK_SIZE, cx*CHUNK_SIZE:(cx+1)*CHUNK_SIZE] = TILE_FLAGS[tiles]
+            if i % FLAG_CHUNKS_PER_STEP == FLAG_CHUNKS_PER_STEP - 1:
+                yield
+        if version == self.version and self._flags is None:
+            self._flags = np.ascontiguousarray(padded[:self.row_count, :self.cols])
+
+    def portal_tiles(self):
+        if self._portals is None or self._portals[0] != self.version:
+            self._portals = (self.version, np.argwhere(self.flags & PORTAL)[:, ::-1])
+        return self._portals[1]
+
+    def is_prepared(self, area):
+        return self._flags is not None and all(key in self.surfaces for key in self.chunks_in(area))
+
+    def prepare(self, area):
+        if self._flags is None:
+            yield from self.compile_flags()
+        self.pathfinder.refresh()
+        yield
+        for cx, cy in list(self.chunks_in(area)):
+            if (cx, cy) not in self.surfaces:
+                self.chunk_surface(cx, cy)
+                yield
+
+    def invalidate(self):
+        self.surfaces.clear()
+        self.version += 1
+
+    def chunks_in(self, rect):
+        chunk_pixels = CHUNK_SIZE * TILE_SIZE
+        for cy in range(max(rect.top, 0) // chunk_pixels, (rect.bottom - 1) // chunk_pixels + 1):
+            for cx in range(max(rect.left, 0) // chunk_pixels, (rect.right - 1) // chunk_pixels + 1):
+                if (cx, cy) in self.chunks:
+                    yield cx, cy
+
+    def render_chunk(self, cx, cy):
+        chunk = self.chunks[(cx, cy)]
+        surface = pygame.Surface((CHUNK_SIZE*TILE_SIZE, CHUNK_SIZE*TILE_SIZE))
+        surface.fill(BLACK)
+        for i, code in enumerate(chunk):
+            char = chr(code)
+            if char in tile_images:
+                y, x = divmod(i, CHUNK_SIZE)
+                surface.blit(tile_images[char], (x*TILE_SIZE, y*TILE_SIZE))
+        return surface.convert()
+
+    def chunk_surface(self, cx, cy):
+        key = (cx, cy)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.surfaces[key] = self.render_chunk(cx, cy)
+            if len(self.surfaces) > MAX_CACHED_CHUNKS:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surface
+
+    def draw(self, screen, camera, area=None):
+        offset_x, offset_y = camera.camera.topleft
+        chunk_pixels = CHUNK_SIZE * TILE_SIZE
+        view = camera.view() if area is None else area.move(-offset_x, -offset_y)
+        for cx, cy in self.chunks_in(view):
+            screen.blit(self.chunk_surface(cx, cy), (cx*chunk_pixels + offset_x, cy*chunk_pixels + offset_y))
+
+portal_links = {
+    1: (2, 1, 5),
+    2: (1, 20, 10)
+}
+
+def spawn_view(tilemap, tile_x, tile_y):
+    view_camera = Camera(tilemap.width, tilemap.height)
+    view_camera.update(pygame.Rect(tile_x*TILE_SIZE, tile_y*TILE_SIZE, TILE_SIZE-1, TILE_SIZE-1))
+    return view_camera.view()
+
+def stream_levels():
+    if player.current_maze not in portal_links:
+        return
+    portals = tilemaps[player.current_maze].portal_tiles()
+    if not len(portals):
+        return
+    player_tile = (player.rect.centerx // TILE_SIZE, player.rect.centery // TILE_SIZE)
+    if np.abs(portals - player_tile).max(axis=1).min() > PREFETCH_DISTANCE:
+        return
+    destination, spawn_x, spawn_y = portal_links[player.current_maze]
+    tilemap = tilemaps[destination]
+    area = spawn_view(tilemap, spawn_x, spawn_y)
+    if not tilemap.is_prepared(area):
+        level_tasks.submit(tilemap.prepare(area), key=("level", destination), priority=PRIORITY_LEVEL)
+
 class Player:
     def __init__(self):
         self.rect = pygame.Rect(3*TILE_SIZE, 1*TILE_SIZE, TILE_SIZE-1, TILE_SIZE-1)
-        self.anim_index = 0
-        self.anim_timer = 0
+        self.sprite = Sprite(cat_animations, "idle")
         self.facing_left = False
         self.inventory = {
             'fish': 0,
@@ -124,211 +972,490 @@ class Player:
             'berries': 0
         }
         self.current_maze = 1
-        self.portal_cooldown = 0
-
-    def draw(self, screen, camera):
-        current_image = cat_anim[self.anim_index]
-        if self.facing_left:
-            current_image = pygame.transform.flip(current_image, True, False)
-        screen.blit(current_image, camera.apply(self).topleft)
-
-def draw_inventory():
-    inventory_text = [
-        f"Fish Bones: {player.inventory['fishbone']}",
-        f"Dog Bones: {player.inventory['dogbone']}",
-        f"Chicken Feed: {player.inventory['chicken']}"
+        self.portal_cooldown = 0.0
+        self.previous = self.rect.topleft
+
+    def interpolated(self, alpha):
+        x = self.previous[0] + (self.rect.x - self.previous[0]) * alpha
+        y = self.previous[1] + (self.rect.y - self.previous[1]) * alpha
+        return pygame.Rect(round(x), round(y), self.rect.width, self.rect.height)
+
+def build_inventory_panel(fishbone, dogbone, chicken):
+    lines = [
+        text_cache.render(f"Fish Bones: {fishbone}", WHITE),
+        text_cache.render(f"Dog Bones: {dogbone}", WHITE),
+        text_cache.render(f"Chicken Feed: {chicken}", WHITE)
     ]
-    for i, text in enumerate(inventory_text):
-        text_surface = font.render(text, True, WHITE)
-        screen.blit(text_surface, (10, 10 + i*30))
+    panel = pygame.Surface((max(line.get_width() for line in lines), 30*(len(lines) - 1) + lines[-1].get_height()), pygame.SRCALPHA)
+    for i, line in enumerate(lines):
+        panel.blit(line, (0, i*30), special_flags=pygame.BLEND_RGBA_MAX)
+    return panel
+
+inventory_panel = CachedPanel(build_inventory_panel)
+
+def inventory_surface():
+    key = (player.inventory['fishbone'], player.inventory['dogbone'], player.inventory['chicken'])
+    return inventory_panel.get(key)
+
+class EntityStore:
+    def __init__(self, capacity=ENTITY_CAPACITY):
+        self.capacity = 0
+        self.count = 0
+        self.free = []
+        self.objects = []
+        self.positions = np.zeros((0, 2))
+        self.velocities = np.zeros((0, 2))
+        self.targets = np.zeros((0, 2))
+        self.speeds = np.zeros(0)
+        self.sizes = np.zeros((0, 2), dtype=np.int32)
+        self.kinds = np.zeros(0, dtype=np.uint8)
+        self.mazes = np.zeros(0, dtype=np.int32)
+        self.alive = np.zeros(0, dtype=bool)
+        self.seeking = np.zeros(0, dtype=bool)
+        self.grow(capacity)
+
+    def __len__(self):
+        return self.count - len(self.free)
+
+    def grow(self, capacity):
+        def resized(array):
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:len(array)] = array
+            return grown
+
+        self.positions = resized(self.positions)
+        self.velocities = resized(self.velocities)
+        self.targets = resized(self.targets)
+        self.speeds = resized(self.speeds)
+        self.sizes = resized(self.sizes)
+        self.kinds = resized(self.kinds)
+        self.mazes = resized(self.mazes)
+        self.alive = resized(self.alive)
+        self.seeking = resized(self.seeking)
+        self.objects.extend([None] * (capacity - self.capacity))
+        self.capacity = capacity
+
+    def add(self, obj, x, y, width, height, kind, maze, speed=0.0):
+        if self.free:
+            index = self.free.pop()
+        else:
+            if self.count == self.capacity:
+                self.grow(self.capacity * 2)
+            index = self.count
+            self.count += 1
+        self.positions[index] = (x, y)
+        self.velocities[index] = 0
+        self.targets[index] = (x, y)
+        self.speeds[index] = speed
+        self.sizes[index] = (width, height)
+        self.kinds[index] = kind
+        self.mazes[index] = maze
+        self.alive[index] = True
+        self.seeking[index] = False
+        self.objects[index] = obj
+        return index
+
+    def remove(self, index):
+        self.alive[index] = False
+        self.seeking[index] = False
+        self.velocities[index] = 0
+        self.objects[index] = None
+        self.free.append(index)
+
+    def remove_maze(self, maze):
+        for index in np.flatnonzero(self.alive[:self.count] & (self.mazes[:self.count] == maze)):
+            self.remove(int(index))
+
+    def rect(self, index):
+        x, y = self.positions[index].tolist()
+        width, height = self.sizes[index].tolist()
+        return pygame.Rect(round(x), round(y), width, height)
+
+    def seek(self, index, x, y):
+        self.targets[index] = (x, y)
+        self.seeking[index] = True
+        self.velocities[index] = 0
+
+    def push(self, index, vx, vy):
+        self.velocities[index] = (vx, vy)
+        self.seeking[index] = False
+
+    def moving(self, index):
+        return bool(self.seeking[index] or self.velocities[index].any())
+
+    def overlapping(self, rect, maze, kind=None):
+        n = self.count
+        positions = np.round(self.positions[:n])
+        sizes = self.sizes[:n]
+        mask = (self.alive[:n] & (self.mazes[:n] == maze)
+                & (positions[:, 0] < rect.right) & (positions[:, 0] + sizes[:, 0] > rect.left)
+                & (positions[:, 1] < rect.bottom) & (positions[:, 1] + sizes[:, 1] > rect.top))
+        if kind is not None:
+            mask &= self.kinds[:n] == kind
+        return np.flatnonzero(mask)
+
+    def step(self, dt):
+        n = self.count
+        drifting = self.alive[:n] & (self.velocities[:n] != 0).any(axis=1)
+        indices = np.flatnonzero(self.seeking[:n] | drifting)
+        if not len(indices):
+            return indices
+
+        old = self.positions[indices]
+        velocities = self.velocities[indices]
+        seek = self.seeking[indices]
+        new = old + velocities * dt
+        if seek.any():
+            limit = (self.speeds[indices[seek]] * dt)[:, None]
+            new[seek] = old[seek] + np.clip(self.targets[indices[seek]] - old[seek], -limit, limit)
+
+        rects = np.column_stack([np.round(new), self.sizes[indices]])
+        mazes = self.mazes[indices]
+        if mazes.min() == mazes.max():
+            blocked = collide_rects(rects, int(mazes[0]))
+        else:
+            blocked = np.zeros(len(indices), dtype=bool)
+            for maze in np.unique(mazes):
+                in_maze = mazes == maze
+                blocked[in_maze] = collide_rects(rects[in_maze], int(maze))
+        new[blocked] = old[blocked]
+
+        self.positions[indices] = new
+        arrived = (new == self.targets[indices]).all(axis=1)
+        self.seeking[indices[seek & (arrived | blocked)]] = False
+
+        velocities *= DRIFT_DRAG ** dt
+        stopped = ~seek & (blocked | (np.abs(velocities) < DRIFT_STOP_SPEED).all(axis=1))
+        velocities[stopped] = 0
+        self.velocities[indices] = velocities
+        settle = indices[stopped]
+        self.targets[settle] = np.round(new[stopped] / TILE_SIZE) * TILE_SIZE
+        self.seeking[settle] = True
+
+        size = self.sizes[indices]
+        old_cells = np.hstack([np.round(old) // SPATIAL_CELL_SIZE, (np.round(old) + size - 1) // SPATIAL_CELL_SIZE])
+        new_cells = np.hstack([np.round(new) // SPATIAL_CELL_SIZE, (np.round(new) + size - 1) // SPATIAL_CELL_SIZE])
+        changed = (old_cells != new_cells).any(axis=1)
+        return indices[changed]
+
+particle_textures = []
+particle_texture_ids = {}
+
+def particle_texture(color, radius=PARTICLE_RADIUS):
+    key = (color, radius)
+    base = particle_texture_ids.get(key)
+    if base is None:
+        base = particle_texture_ids[key] = len(particle_textures)
+        for step in range(PARTICLE_FADE_STEPS):
+            surface = pygame.Surface((radius*2, radius*2)).convert()
+            surface.fill(BLACK)
+            pygame.draw.circle(surface, color, (radius, radius), radius)
+            surface.set_colorkey(BLACK, pygame.RLEACCEL)
+            surface.set_alpha(255 * (PARTICLE_FADE_STEPS - step) // PARTICLE_FADE_STEPS, pygame.RLEACCEL)
+            particle_textures.append(surface)
+    return base
+
+class ParticleSystem:
+    def __init__(self, capacity=PARTICLE_CAPACITY):
+        self.capacity = capacity
+        self.count = 0
+        self.positions = np.zeros((capacity, 2), dtype=np.float32)
+        self.velocities = np.zeros((capacity, 2), dtype=np.float32)
+        self.ages = np.zeros(capacity, dtype=np.float32)
+        self.lifetimes = np.ones(capacity, dtype=np.float32)
+        self.textures = np.zeros(capacity, dtype=np.int32)
+        self.mazes = np.zeros(capacity, dtype=np.int32)
+        self.rng = np.random.default_rng(0)
+
+    def __len__(self):
+        return self.count
+
+    def emit(self, x, y, maze, count, texture, speed, lifetime):
+        count = min(count, self.capacity - self.count)
+        if count <= 0:
+            return
+        new = slice(self.count, self.count + count)
+        angles = self.rng.uniform(0, math.tau, count)
+        speeds = self.rng.uniform(speed * 0.3, speed, count)
+        self.positions[new] = (x, y)
+        self.velocities[new, 0] = np.cos(angles) * speeds
+        self.velocities[new, 1] = np.sin(angles) * speeds
+        self.ages[new] = 0
+        self.lifetimes[new] = self.rng.uniform(lifetime * 0.5, lifetime, count)
+        self.textures[new] = texture
+        self.mazes[new] = maze
+        self.count += count
+
+    def update(self, dt):
+        count = self.count
+        if not count:
+            return
+        self.ages[:count] += dt
+        self.velocities[:count] *= PARTICLE_DRAG ** dt
+        self.positions[:count] += self.velocities[:count] * dt
+        keep = np.flatnonzero(self.ages[:count] < self.lifetimes[:count])
+        if len(keep) < count:
+            for array in (self.positions, self.velocities, self.ages, self.lifetimes, self.textures, self.mazes):
+                array[:len(keep)] = array[keep]
+            self.count = len(keep)
+
+    def visible(self, offset, maze):
+        count = self.count
+        points = self.positions[:count].astype(np.int32) + np.array(offset, dtype=np.int32) - PARTICLE_RADIUS
+        shown = ((self.mazes[:count] == maze) & (points[:, 0] > -PARTICLE_RADIUS*2) & (points[:, 1] > -PARTICLE_RADIUS*2)
+                 & (points[:, 0] < SCREEN_WIDTH) & (points[:, 1] < SCREEN_HEIGHT))
+        return np.flatnonzero(shown), points
+
+    def batches(self, offset, maze):
+        if not self.count:
+            return []
+        shown, points = self.visible(offset, maze)
+        if not len(shown):
+            return []
+        steps = np.minimum(self.ages[shown] / self.lifetimes[shown] * PARTICLE_FADE_STEPS, PARTICLE_FADE_STEPS - 1)
+        textures = self.textures[shown] + steps.astype(np.int32)
+        order = np.argsort(textures, kind="stable")
+        textures = textures[order]
+        points = points[shown][order]
+        splits = np.flatnonzero(np.diff(textures)) + 1
+        return [(particle_textures[texture], group)
+                for texture, group in zip(textures[np.r_[0, splits]].tolist(), np.split(points, splits))]
+
+    def bounds(self, batches):
+        if not batches:
+            return None
+        low = np.min([points.min(axis=0) for texture, points in batches], axis=0)
+        high = np.max([points.max(axis=0) for texture, points in batches], axis=0) + PARTICLE_RADIUS*2
+        return pygame.Rect(int(low[0]), int(low[1]), int(high[0] - low[0]), int(high[1] - low[1]))
+
+    def draw(self, surface, batches, area=None):
+        for texture, points in batches:
+            if area is not None:
+                points = points[(points[:, 0] < area.right) & (points[:, 0] + PARTICLE_RADIUS*2 > area.left)
+                                & (points[:, 1] < area.bottom) & (points[:, 1] + PARTICLE_RADIUS*2 > area.top)]
+            surface.blits(zip(repeat(texture), points.tolist()), doreturn=False)
+
+def pickup_effect(collectible):
+    rect = collectible.rect
+    particles.emit(rect.centerx, rect.centery, collectible.maze_number, 24, particle_texture(PICKUP_COLOR), 120, 0.6)
+
+def portal_effect(rect, maze):
+    particles.emit(rect.centerx, rect.centery, maze, 48, particle_texture(PORTAL_COLOR), 160, 0.8)
+
+def quest_effect(npc):
+    rect = npc.rect
+    for color in QUEST_COLORS:
+        particles.emit(rect.centerx, rect.centery, npc.maze_number, 40, particle_texture(color), 220, 1.2)
+
+DialogueNode = namedtuple("DialogueNode", ["text", "options", "next"])
+
+class DialogueGraph:
+    def __init__(self, nodes, required, complete_state):
+        self.nodes = MappingProxyType(nodes)
+        self.required = required
+        self.complete_state = complete_state
+
+def compile_dialogue_node(node, **values):
+    text = tuple(line.format(**values) for line in node["text"]) if values else tuple(node["text"])
+    return DialogueNode(text, tuple(node["options"]), tuple(node["next"]))
+
+def load_dialogues(path):
+    with open(path) as f:
+        data = json.load(f)
+    graphs = {}
+    for npc_type, spec in data["npcs"].items():
+        nodes = {i: compile_dialogue_node(node) for i, node in enumerate(spec["states"])}
+        required = tuple(spec.get("required", {}).items())
+        complete_state = len(nodes)
+        if required:
+            complete = spec.get("complete", data["quest_complete"])
+            nodes[complete_state] = compile_dialogue_node(complete, item=required[0][0])
+        graphs[npc_type] = DialogueGraph(nodes, required, complete_state)
+    return graphs
+
+dialogue_graphs = load_dialogues(DIALOGUE_DATA)
+
+class QuestBoard:
+    def __init__(self, inventory):
+        self.inventory = inventory
+        self.waiting = {}
+        self.pending = {}
+        self.order = 0
+
+    def register(self, npc):
+        if npc.quest_complete or not npc.dialogue.required:
+            return
+        self.pending[npc] = 0
+        for item, amount in npc.dialogue.required:
+            if self.inventory.get(item, 0) < amount:
+                heapq.heappush(self.waiting.setdefault(item, []), (amount, self.order, npc))
+                self.order += 1
+                self.pending[npc] += 1
+        if self.pending[npc] == 0:
+            self.complete(npc)
+
+    def item_changed(self, item):
+        waiting = self.waiting.get(item)
+        count = self.inventory.get(item, 0)
+        while waiting and waiting[0][0] <= count:
+            amount, order, npc = heapq.heappop(waiting)
+            self.pending[npc] -= 1
+            if self.pending[npc] == 0:
+                self.complete(npc)
+
+    def complete(self, npc):
+        del self.pending[npc]
+        npc.complete_quest()
 
 class NPC:
-    def __init__(self, x, y, image_path, npc_type, maze_number):
-        self.rect = pygame.Rect(x*TILE_SIZE, y*TILE_SIZE, TILE_SIZE-1, TILE_SIZE-1)
-        self.image = load_image(image_path)
+    index_name = "npcs"
+
+    def __init__(self, x, y, image_path, npc_type, maze_number, behavior="idle", goal=None):
+        if npc_type not in dialogue_graphs:
+            raise ValueError(f"Unknown NPC type: {npc_type}")
+        self.uid = len(world_npcs)
+        world_npcs.append(self)
+        self.index = entities.add(self, x*TILE_SIZE, y*TILE_SIZE, TILE_SIZE-1, TILE_SIZE-1, KIND_NPC, maze_number, NPC_SPEED)
+        self.sprite = Sprite.static(load_image(image_path))
+        self.dialogue = dialogue_graphs[npc_type]
         self.dialogue_state = 0
         self.quest_complete = False
         self.npc_type = npc_type
         self.maze_number = maze_number
-        
-        if npc_type == "whale":
-            self.dialogues = {
-                0: {
-                    "text": ["*Splashes* Hi there!", "Could you find some seaweed for me?"],
-                    "options": ["Of course!", "Not now"],
-                    "next": [1, None],
-                    "required": {"seaweed": 3}
-                },
-                1: {
-                    "text": ["I need 3 pieces of seaweed.", "They're floating around somewhere."],
-                    "options": ["I'll help", "Maybe later"],
-                    "next": [2, None]
-                },
-                2: {
-                    "text": ["Thank you! Happy swimming!", "Watch out for the currents!"],
-                    "options": ["Will do!", "Got it"],
-                    "next": [None, None]
-                }
-            }
-        elif npc_type == "bear":
-            self.dialogues = {
-                0: {
-                    "text": ["*Growls friendly* Hello!", "I'm looking for some honey..."],
-                    "options": ["I'll help!", "Not now"],
-                    "next": [1, None],
-                    "required": {"honey": 2}
-                },
-                1: {
-                    "text": ["Need 2 jars of honey.", "Be careful in the forest!"],
-                    "options": ["Got it!", "Later"],
-                    "next": [2, None]
-                },
-                2: {
-                    "text": ["The honey smells so good!", "I can't wait to find it all!"],
-                    "options": ["I'll keep looking!", "See you soon"],
-                    "next": [None, None]
-                }
-            }
-        elif npc_type == "beaver":
-            self.dialogues = {
-                0: {
-                    "text": ["Hi friend!", "Have you seen any berries?"],
-                    "options": ["I can help!", "Not now"],
-                    "next": [1, None],
-                    "required": {"berries": 4}
-                },
-                1: {
-                    "text": ["Need 4 bunches of berries.", "They're scattered around."],
-                    "options": ["I'll look", "Maybe later"],
-                    "next": [2, None]
-                },
-                2: {
-                    "text": ["You're the best!", "I'll wait here for the berries."],
-                    "options": ["No problem!", "Back soon"],
-                    "next": [None, None]
-                }
-            }
-        elif npc_type == "pitbull":
-            self.dialogues = {
-                0: {
-                    "text": ["Woof! Hey cat!", "I need help collecting fish bones."],
-                    "options": ["Tell me more", "Not now"],
-                    "next": [1, None],
-                    "required": {"fishbone": 3}
-                },
-                1: {
-                    "text": ["I need 3 fish bones.", "Can you help me find them?"],
-                    "options": ["I'll help", "Maybe later"],
-                    "next": [2, None]
-                },
-                2: {
-                    "text": ["Great! Look around the map.", "They're scattered everywhere!"],
-                    "options": ["Got it!", "Wait..."],
-                    "next": [None, None]
-                }
-            }
-        elif npc_type == "poodle":
-            self.dialogues = {
-                0: {
-                    "text": ["Hello kitty!", "Could you find some dog bones for me?"],
-                    "options": ["Sure!", "Not now"],
-                    "next": [1, None],
-                    "required": {"dogbone": 2}
-                },
-                1: {
-                    "text": ["I need 2 dog bones.", "They're somewhere around here."],
-                    "options": ["I'll look", "Later"],
-                    "next": [2, None]
-                },
-                2: {
-                    "text": ["Thank you! Happy hunting!", "Be careful near the water!"],
-                    "options": ["Will do!", "Okay"],
-                    "next": [None, None]
-                }
-            }
-        elif npc_type == "chick":
-            self.dialogues = {
-                0: {
-                    "text": ["Cheep cheep!", "Have you seen my chicken feed?"],
-                    "options": ["I can help!", "Not now"],
-                    "next": [1, None],
-                    "required": {"chicken": 4}
-                },
-                1: {
-                    "text": ["I need 4 bags of feed.", "The wind scattered them!"],
-                    "options": ["I'll find them", "Maybe later"],
-                    "next": [2, None]
-                },
-                2: {
-                    "text": ["You're so kind!", "I'll wait here."],
-                    "options": ["No problem!", "See you soon"],
-                    "next": [None, None]
-                }
-            }
-        elif npc_type == "beaver":
-            self.dialogues = {
-                0: {
-                    "text": ["Hi friend!", "Have you seen any berries?"],
-                    "options": ["I can help!", "Not now"],
-                    "next": [1, None],
-                    "required": {"berries": 4}
-                },
-                1: {
-                    "text": ["Need 4 bunches of berries.", "They're scattered around."],
-                    "options": ["I'll look", "Maybe later"],
-                    "next": [2, None]
-                }
-            }
-        else:
-            super().__init__(x, y, image_path, npc_type)
-
-    def interact(self, player_inventory):
-        if pygame.Rect.colliderect(self.rect.inflate(TILE_SIZE*2, TILE_SIZE*2), player.rect):
-            if not self.quest_complete:
-                current_dialogue = self.dialogues.get(0)
-                if current_dialogue and "required" in current_dialogue:
-                    required_items = current_dialogue["required"]
-                    for item, amount in required_items.items():
-                        if player_inventory[item] >= amount:
-                            self.quest_complete = True
-                            self.dialogue_state = 3
-                            self.dialogues[3] = {
-                                "text": [f"You found all the {item}s!", "Thank you so much!"],
-                                "options": ["You're welcome!", "No problem!"],
-                                "next": [None, None]
-                            }
-            return True
-        return False
+        self.behavior = behavior
+        self.goal = goal
+        self.path = []
+        self.wait = 0.0
+        self.rng = random.Random(x * 7919 + y * 104729 + maze_number)
+
+    @property
+    def rect(self):
+        return entities.rect(self.index)
+
+    @property
+    def tile(self):
+        return (self.rect.x // TILE_SIZE, self.rect.y // TILE_SIZE)
+
+    def choose_step(self, pathfinder, player_tile, dt):
+        tile = self.tile
+        if self.behavior == "follow":
+            if abs(tile[0] - player_tile[0]) + abs(tile[1] - player_tile[1]) <= 1:
+                return None
+            return pathfinder.flow_field(player_tile).next_step(tile)
+        if self.behavior == "goto":
+            if self.goal is None or tile == self.goal:
+                return None
+            return pathfinder.flow_field(self.goal).next_step(tile)
+        if self.behavior == "wander":
+            if not self.path:
+                self.wait -= dt
+                if self.wait > 0:
+                    return None
+                self.wait = WANDER_PAUSE
+                goal = (tile[0] + self.rng.randint(-WANDER_RADIUS, WANDER_RADIUS),
+                        tile[1] + self.rng.randint(-WANDER_RADIUS, WANDER_RADIUS))
+                self.path = pathfinder.find_path(tile, goal, (2*WANDER_RADIUS + 1)**2) or []
+            return self.path.pop(0) if self.path else None
+        return None
+
+    def update(self, dt, pathfinder, player_tile):
+        if entities.moving(self.index):
+            return
+        step = self.choose_step(pathfinder, player_tile, dt)
+        if step is not None:
+            entities.seek(self.index, step[0]*TILE_SIZE, step[1]*TILE_SIZE)
+
+    @property
+    def image(self):
+        return self.sprite.image()
+
+    @property
+    def dialogues(self):
+        return self.dialogue.nodes
+
+    def complete_quest(self):
+        self.quest_complete = True
+        self.dialogue_state = self.dialogue.complete_state
+        quest_effect(self)
+
+    def knock_back(self, dx, dy):
+        self.path = []
+        entities.push(self.index, np.sign(dx) * KNOCKBACK_SPEED, np.sign(dy) * KNOCKBACK_SPEED)
+
+    def interact(self, player_rect):
+        return self.rect.inflate(TILE_SIZE*2, TILE_SIZE*2).colliderect(player_rect)
 
 class Collectible:
+    index_name = "collectibles"
+
     def __init__(self, x, y, item_type, maze_number):
-        self.rect = pygame.Rect(x*TILE_SIZE, y*TILE_SIZE, TILE_SIZE-1, TILE_SIZE-1)
+        self.uid = len(world_collectibles)
+        world_collectibles.append(self)
+        self.spawn = (x*TILE_SIZE, y*TILE_SIZE)
+        self.index = entities.add(self, self.spawn[0], self.spawn[1], TILE_SIZE-1, TILE_SIZE-1, KIND_COLLECTIBLE, maze_number)
         self.item_type = item_type
-        self.image = collectible_images[item_type]
+        self.sprite = Sprite.static(collectible_images[item_type])
         self.maze_number = maze_number
 
+    @property
+    def rect(self):
+        return entities.rect(self.index)
+
+    @property
+    def collected(self):
+        return self.index is None
+
+    def collect(self):
+        tilemaps[self.maze_number].collectibles.remove(self)
+        entities.remove(self.index)
+        self.index = None
+        collected_uids.append(self.uid)
+
+    def respawn(self):
+        self.index = entities.add(self, self.spawn[0], self.spawn[1], TILE_SIZE-1, TILE_SIZE-1, KIND_COLLECTIBLE, self.maze_number)
+        tilemaps[self.maze_number].collectibles.insert(self)
+
+    @property
+    def image(self):
+        return self.sprite.image()
+
 def check_collision(rect, current_maze):
-    maze = MAZE1 if current_maze == 1 else MAZE2
-    left = rect.left // TILE_SIZE
-    right = rect.right // TILE_SIZE
-    top = rect.top // TILE_SIZE
-    bottom = rect.bottom // TILE_SIZE
-    
-    for y in range(top, bottom+1):
-        for x in range(left, right+1):
-            if 0 <= y < len(maze) and 0 <= x < len(maze[y]):
-                if maze[y][x] in ['X', 'W']:
-                    return True
-    return False
+    flags = tilemaps[current_maze].flags
+    rows, cols = flags.shape
+    left = max(rect.left // TILE_SIZE, 0)
+    right = min(rect.right // TILE_SIZE, cols - 1)
+    top = max(rect.top // TILE_SIZE, 0)
+    bottom = min(rect.bottom // TILE_SIZE, rows - 1)
+
+    if left > right or top > bottom:
+        return False
+    return bool((flags[top:bottom+1, left:right+1] & SOLID).any())
 
 def check_portal(rect, current_maze):
-    maze = MAZE1 if current_maze == 1 else MAZE2
-    center_x = rect.centerx // TILE_SIZE
-    center_y = rect.centery // TILE_SIZE
-    
-    if 0 <= center_y < len(maze) and 0 <= center_x < len(maze[center_y]):
-        return maze[center_y][center_x] == 'T'
-    return False
+    return bool(tile_flags_at(rect.centerx // TILE_SIZE, rect.centery // TILE_SIZE, current_maze) & PORTAL)
+
+def tile_flags_at(tile_x, tile_y, current_maze):
+    flags = tilemaps[current_maze].flags
+    tile_x = np.asarray(tile_x)
+    tile_y = np.asarray(tile_y)
+    rows, cols = flags.shape
+    inside = (tile_x >= 0) & (tile_x < cols) & (tile_y >= 0) & (tile_y < rows)
+    return np.where(inside, flags[np.clip(tile_y, 0, rows - 1), np.clip(tile_x, 0, cols - 1)], 0)
+
+def collide_rects(rects, current_maze, mask=SOLID):
+    rects = np.asarray(rects, dtype=np.int64).reshape(-1, 4)
+    left = rects[:, 0] // TILE_SIZE
+    top = rects[:, 1] // TILE_SIZE
+    right = (rects[:, 0] + rects[:, 2]) // TILE_SIZE
+    bottom = (rects[:, 1] + rects[:, 3]) // TILE_SIZE
+    hit = np.zeros(len(rects), dtype=bool)
+
+    for dy in range(int((bottom - top).max(initial=0)) + 1):
+        tile_y = np.minimum(top + dy, bottom)
+        for dx in range(int((right - left).max(initial=0)) + 1):
+            tile_x = np.minimum(left + dx, right)
+            hit |= (tile_flags_at(tile_x, tile_y, current_maze) & mask) != 0
+    return hit
 
 def handle_dialogue(key):
     global in_dialogue, selected_option, current_npc
@@ -342,65 +1469,719 @@ def handle_dialogue(key):
     elif key == pygame.K_DOWN:
         selected_option = 1
     elif key == pygame.K_RETURN:
-        next_state = current_dialogue["next"][selected_option]
+        next_state = current_dialogue.next[selected_option]
         if next_state is not None:
             current_npc.dialogue_state = next_state
         else:
             in_dialogue = False
 
-def draw_dialogue():
-    current_dialogue = current_npc.dialogues.get(current_npc.dialogue_state)
-    if not current_dialogue:
-        return
-
-    dialogue_height = 200
-    dialogue_surface = pygame.Surface((SCREEN_WIDTH, dialogue_height), pygame.SRCALPHA)
+def build_dialogue_panel(text, options, selected):
+    dialogue_surface = pygame.Surface((SCREEN_WIDTH, DIALOGUE_HEIGHT), pygame.SRCALPHA)
     dialogue_surface.fill((0, 0, 0, 180))
     
     y_offset = 20
-    for line in current_dialogue["text"]:
-        text = font.render(line, True, WHITE)
-        dialogue_surface.blit(text, (20, y_offset))
+    for line in text:
+        dialogue_surface.blit(text_cache.render(line, WHITE), (20, y_offset))
         y_offset += 40
     
-    for i, option in enumerate(current_dialogue["options"]):
-        color = GREEN if i == selected_option else WHITE
-        text = font.render(f"{'>' if i == selected_option else ' '} {option}", True, color)
-        dialogue_surface.blit(text, (20, y_offset + i*40))
-    
-    screen.blit(dialogue_surface, (0, SCREEN_HEIGHT - dialogue_height))
-player = Player()
-camera = Camera(len(MAZE1[0])*TILE_SIZE, len(MAZE1)*TILE_SIZE)
-
-npcs = [
-    NPC(15, 7, os.path.join("assets", "pitbull.png"), "pitbull", 1),
-    NPC(8, 3, os.path.join("assets", "poodle.png"), "poodle", 1),
-    NPC(18, 10, os.path.join("assets", "chick.png"), "chick", 1),
-    NPC(5, 3, os.path.join("assets", "blueywhale.png"), "whale", 2),
-    NPC(15, 7, os.path.join("assets", "bear.png"), "bear", 2),
-    NPC(10, 9, os.path.join("assets", "Beaver.png"), "beaver", 2)
-]
+    for i, option in enumerate(options):
+        color = GREEN if i == selected else WHITE
+        label = text_cache.render(f"{'>' if i == selected else ' '} {option}", color)
+        dialogue_surface.blit(label, (20, y_offset + i*40))
+    return dialogue_surface
 
-collectibles = [
-    Collectible(5, 3, "fishbone", 1),
-    Collectible(8, 7, "fishbone", 1),
-    Collectible(12, 5, "fishbone", 1),
-    Collectible(14, 2, "dogbone", 1),
-    Collectible(17, 8, "dogbone", 1),
-    Collectible(6, 9, "chicken", 1),
-    Collectible(10, 4, "chicken", 1),
-    Collectible(13, 6, "chicken", 1),
-    Collectible(16, 3, "chicken", 1),
-    Collectible(3, 2, "seaweed", 2),
-    Collectible(7, 4, "seaweed", 2),
-    Collectible(12, 3, "seaweed", 2),
-    Collectible(16, 7, "honey", 2),
-    Collectible(19, 8, "honey", 2),
-    Collectible(4, 6, "berries", 2),
-    Collectible(8, 8, "berries", 2),
-    Collectible(13, 7, "berries", 2),
-    Collectible(17, 5, "berries", 2)
-]
+dialogue_panel = CachedPanel(build_dialogue_panel)
+
+def dialogue_surface():
+    current_dialogue = current_npc.dialogues.get(current_npc.dialogue_state)
+    if not current_dialogue:
+        return None
+
+    return dialogue_panel.get((current_dialogue.text, current_dialogue.options, selected_option))
+
+def scene_sprites(tilemap, player_rect):
+    view = camera.view()
+    sprites = []
+    for collectible in tilemap.collectibles.query(view):
+        sprites.append((collectible, collectible.image, camera.apply(collectible).topleft))
+    for npc in tilemap.npcs.query(view):
+        sprites.append((npc, npc.image, camera.apply(npc).topleft))
+    sprites.append((player, player.sprite.image(player.facing_left), camera.apply(player_rect).topleft))
+    overlays = []
+    if FOG_OF_WAR:
+        tilemap.fog.update((player.rect.centerx // TILE_SIZE, player.rect.centery // TILE_SIZE))
+        fog, position = tilemap.fog.overlay(view)
+        overlays.append(("fog", fog, camera.apply(pygame.Rect(position, (0, 0))).topleft))
+    overlays.append(("inventory", inventory_surface(), (10, 10)))
+    if in_dialogue:
+        panel = dialogue_surface()
+        if panel is not None:
+            overlays.append(("dialogue", panel, (0, SCREEN_HEIGHT - DIALOGUE_HEIGHT)))
+    if profiler.show_overlay:
+        overlay = profiler.overlay_surface()
+        overlays.append(("profiler", overlay, (SCREEN_WIDTH - overlay.get_width() - 10, 10)))
+    return sprites, overlays
+
+class DirtyTracker:
+    def __init__(self):
+        self.background = None
+        self.sprites = None
+        self.areas = []
+
+    def reset(self):
+        self.sprites = None
+
+    def update(self, background, sprites, areas=()):
+        previous = self.sprites
+        previous_areas = self.areas
+        self.sprites = {key: (surface, pos) for key, surface, pos in sprites}
+        self.areas = [area.clip(SCREEN_RECT) for area in areas]
+        if previous is None or background != self.background:
+            self.background = background
+            return None
+
+        dirty = [area for area in previous_areas + self.areas if area.width and area.height]
+        for key in previous.keys() | self.sprites.keys():
+            old = previous.get(key)
+            new = self.sprites.get(key)
+            if old == new:
+                continue
+            for state in (old, new):
+                if state is not None:
+                    rect = state[0].get_rect(topleft=state[1]).clip(SCREEN_RECT)
+                    if rect.width and rect.height:
+                        dirty.append(rect)
+
+        merged = []
+        for rect in dirty:
+            index = rect.collidelist(merged)
+            while index != -1:
+                rect = rect.union(merged.pop(index))
+                index = rect.collidelist(merged)
+            merged.append(rect)
+        return merged
+
+dirty_tracker = DirtyTracker()
+drawn_generation = None
+
+def draw_frame(tilemap, alpha=1.0):
+    global drawn_generation
+    if drawn_generation != asset_generation:
+        for loaded_map in tilemaps.values():
+            loaded_map.surfaces.clear()
+        dirty_tracker.reset()
+        drawn_generation = asset_generation
+    player_rect = player.interpolated(alpha)
+    camera.update(player_rect)
+    with profiler.section("sprites"):
+        sprites, overlays = scene_sprites(tilemap, player_rect)
+    with profiler.section("particles"):
+        particle_batches = particles.batches(camera.camera.topleft, player.current_maze)
+    dirty = None
+    if DIRTY_RECT_RENDERING:
+        particle_area = particles.bounds(particle_batches)
+        dirty = dirty_tracker.update((tilemap, tilemap.version, camera.camera.topleft, tilemap.fog.key),
+                                     sprites + overlays, () if particle_area is None else (particle_area,))
+
+    if dirty is None:
+        with profiler.section("map"):
+            screen.fill(BLACK)
+            tilemap.draw(screen, camera)
+        with profiler.section("blit"):
+            screen.blits([(surface, pos) for key, surface, pos in sprites], doreturn=False)
+            particles.draw(screen, particle_batches)
+            screen.blits([(surface, pos) for key, surface, pos in overlays], doreturn=False)
+        return None
+
+    for rect in dirty:
+        screen.set_clip(rect)
+        screen.fill(BLACK, rect)
+        tilemap.draw(screen, camera, rect)
+        screen.blits([(surface, pos) for key, surface, pos in sprites
+                      if rect.colliderect(surface.get_rect(topleft=pos))], doreturn=False)
+        particles.draw(screen, particle_batches, rect)
+        screen.blits([(surface, pos) for key, surface, pos in overlays
+                      if rect.colliderect(surface.get_rect(topleft=pos))], doreturn=False)
+    screen.set_clip(None)
+    return dirty
+
+def present(dirty):
+    if dirty is None:
+        pygame.display.flip()
+    elif dirty:
+        pygame.display.update(dirty)
+
+def render(tilemap, alpha=1.0):
+    with profiler.section("render"):
+        dirty = draw_frame(tilemap, alpha)
+    with profiler.section("present"):
+        present(dirty)
+
+class InputRecorder:
+    def __init__(self):
+        self.events = []
+
+    def record(self, tick, event):
+        if event.type in (pygame.KEYDOWN, pygame.KEYUP) and event.key != pygame.K_ESCAPE:
+            self.events.append((tick, event.type, event.key))
+
+    def save(self, path, ticks):
+        data = {
+            "version": INPUT_FORMAT_VERSION,
+            "tick_rate": TICK_RATE,
+            "ticks": ticks,
+            "events": [[tick, "down" if event_type == pygame.KEYDOWN else "up", key]
+                       for tick, event_type, key in self.events]
+        }
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+class InputReplay:
+    def __init__(self, events, ticks):
+        self.ticks = ticks
+        self.by_tick = {}
+        for tick, event_type, key in events:
+            self.by_tick.setdefault(tick, []).append(pygame.event.Event(event_type, key=key))
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") != INPUT_FORMAT_VERSION or data.get("tick_rate") != TICK_RATE:
+            raise ValueError(f"{path} was recorded with an incompatible input format or tick rate")
+        events = [(tick, pygame.KEYDOWN if kind == "down" else pygame.KEYUP, key)
+                  for tick, kind, key in data["events"]]
+        return cls(events, data["ticks"])
+
+    def events_for(self, tick):
+        return self.by_tick.get(tick, ())
+
+def create_world():
+    tilemaps = {
+        1: TileMap(MAZE1),
+        2: TileMap(MAZE2)
+    }
+    player = Player()
+    world = {
+        "tilemaps": tilemaps,
+        "entities": EntityStore(),
+        "particles": ParticleSystem(),
+        "level_tasks": TaskQueue(),
+        "save_manager": SaveManager(SaveStorage(SAVE_DIR)),
+        "world_npcs": [],
+        "world_collectibles": [],
+        "collected_uids": [],
+        "player": player,
+        "camera": Camera(tilemaps[1].width, tilemaps[1].height),
+        "quest_board": QuestBoard(player.inventory),
+        "held_keys": set(),
+        "tick_count": 0,
+        "in_dialogue": False,
+        "selected_option": 0,
+        "current_npc": None
+    }
+    globals().update(world)
+
+    world["npcs"] = npcs = [
+        NPC(15, 7, os.path.join("assets", "pitbull.png"), "pitbull", 1),
+        NPC(8, 3, os.path.join("assets", "poodle.png"), "poodle", 1),
+        NPC(18, 10, os.path.join("assets", "chick.png"), "chick", 1, behavior="wander"),
+        NPC(5, 3, os.path.join("assets", "blueywhale.png"), "whale", 2),
+        NPC(15, 7, os.path.join("assets", "bear.png"), "bear", 2),
+        NPC(10, 9, os.path.join("assets", "Beaver.png"), "beaver", 2, behavior="wander")
+    ]
+
+    world["collectible_spawns"] = collectible_spawns = [
+        Collectible(5, 3, "fishbone", 1),
+        Collectible(8, 7, "fishbone", 1),
+        Collectible(12, 5, "fishbone", 1),
+        Collectible(14, 2, "dogbone", 1),
+        Collectible(17, 8, "dogbone", 1),
+        Collectible(6, 9, "chicken", 1),
+        Collectible(10, 4, "chicken", 1),
+        Collectible(13, 6, "chicken", 1),
+        Collectible(16, 3, "chicken", 1),
+        Collectible(3, 2, "seaweed", 2),
+        Collectible(7, 4, "seaweed", 2),
+        Collectible(12, 3, "seaweed", 2),
+        Collectible(16, 7, "honey", 2),
+        Collectible(19, 8, "honey", 2),
+        Collectible(4, 6, "berries", 2),
+        Collectible(8, 8, "berries", 2),
+        Collectible(13, 7, "berries", 2),
+        Collectible(17, 5, "berries", 2)
+    ]
+
+    for npc in npcs:
+        tilemaps[npc.maze_number].npcs.insert(npc)
+        world["quest_board"].register(npc)
+    for collectible in collectible_spawns:
+        tilemaps[collectible.maze_number].collectibles.insert(collectible)
+    globals().update(world)
+    return world
+
+NPC_RECORD = np.dtype([("uid", "<u4"), ("x", "<f4"), ("y", "<f4"), ("state", "<i2"), ("complete", "u1")])
+EDIT_RECORD = np.dtype([("maze", "<i4"), ("x", "<i4"), ("y", "<i4"), ("tile", "u1")])
+SAVE_HEADER = struct.Struct("<4sHBI")
+PLAYER_RECORD = struct.Struct("<iiiBfI")
+COUNT = struct.Struct("<I")
+FOG_RECORD = struct.Struct("<iII")
+RECORD_BASE = 0
+RECORD_DELTA = 1
+
+def npc_records():
+    records = np.zeros(len(world_npcs), dtype=NPC_RECORD)
+    if world_npcs:
+        indices = [npc.index for npc in world_npcs]
+        positions = np.where(entities.seeking[indices, None], entities.targets[indices], entities.positions[indices])
+        records["uid"] = np.arange(len(world_npcs))
+        records["x"] = positions[:, 0]
+        records["y"] = positions[:, 1]
+        records["state"] = [npc.dialogue_state for npc in world_npcs]
+        records["complete"] = [npc.quest_complete for npc in world_npcs]
+    return records
+
+def encode_payload(npc_rows, collected, edits, fog_mazes):
+    parts = [
+        PLAYER_RECORD.pack(player.rect.x, player.rect.y, player.current_maze, player.facing_left, player.portal_cooldown, tick_count),
+        COUNT.pack(len(player.inventory))
+    ]
+    for name, count in player.inventory.items():
+        encoded = name.encode("utf-8")
+        parts.append(struct.pack(f"<B{len(encoded)}si", len(encoded), encoded, count))
+    for rows, dtype in ((npc_rows, NPC_RECORD), (np.asarray(collected, dtype="<u4"), np.dtype("<u4")), (edits, EDIT_RECORD)):
+        parts.append(COUNT.pack(len(rows)))
+        parts.append(np.asarray(rows, dtype=dtype).tobytes())
+    parts.append(COUNT.pack(len(fog_mazes)))
+    for maze in fog_mazes:
+        explored = tilemaps[maze].fog.explored
+        parts.append(FOG_RECORD.pack(maze, *explored.shape))
+        parts.append(explored.tobytes())
+    return b"".join(parts)
+
+def decode_payload(payload):
+    x, y, maze, facing_left, cooldown, ticks = PLAYER_RECORD.unpack_from(payload)
+    offset = PLAYER_RECORD.size
+    inventory = {}
+    (items,) = COUNT.unpack_from(payload, offset)
+    offset += COUNT.size
+    for _ in range(items):
+        length = payload[offset]
+        name = payload[offset + 1:offset + 1 + length].decode("utf-8")
+        (count,) = struct.unpack_from("<i", payload, offset + 1 + length)
+        inventory[name] = count
+        offset += 5 + length
+
+    tables = []
+    for dtype in (NPC_RECORD, np.dtype("<u4"), EDIT_RECORD):
+        (rows,) = COUNT.unpack_from(payload, offset)
+        offset += COUNT.size
+        tables.append(np.frombuffer(payload, dtype=dtype, count=rows, offset=offset))
+        offset += rows * dtype.itemsize
+
+    fog = {}
+    if offset < len(payload):
+        (mazes,) = COUNT.unpack_from(payload, offset)
+        offset += COUNT.size
+        for _ in range(mazes):
+            maze, rows, row_bytes = FOG_RECORD.unpack_from(payload, offset)
+            offset += FOG_RECORD.size
+            fog[maze] = np.frombuffer(payload, dtype=np.uint8, count=rows * row_bytes, offset=offset).reshape(rows, row_bytes)
+            offset += rows * row_bytes
+    return {
+        "player": (x, y, maze, bool(facing_left), cooldown, ticks),
+        "inventory": inventory,
+        "npcs": tables[0],
+        "collected": tables[1],
+        "edits": tables[2],
+        "fog": fog
+    }
+
+def apply_payload(state, full):
+    global tick_count, quest_board, in_dialogue, current_npc
+    x, y, maze, facing_left, cooldown, ticks = state["player"]
+    player.rect.topleft = (x, y)
+    player.previous = player.rect.topleft
+    player.current_maze = maze
+    player.facing_left = facing_left
+    player.portal_cooldown = cooldown
+    tick_count = ticks
+    player.inventory.update(state["inventory"])
+
+    npc_rows = state["npcs"]
+    restored = [world_npcs[uid] for uid in npc_rows["uid"].tolist()]
+    if restored:
+        indices = [npc.index for npc in restored]
+        positions = np.column_stack([npc_rows["x"], npc_rows["y"]]).astype(entities.positions.dtype)
+        moved = (entities.positions[indices] != positions).any(axis=1) | entities.seeking[indices]
+        entities.positions[indices] = positions
+        entities.seeking[indices] = False
+        entities.velocities[indices] = 0
+        for npc, dialogue_state, complete, npc_moved in zip(restored, npc_rows["state"].tolist(), npc_rows["complete"].tolist(), moved.tolist()):
+            npc.dialogue_state = dialogue_state
+            npc.quest_complete = bool(complete)
+            npc.path = []
+            if npc_moved:
+                tilemaps[npc.maze_number].npcs.move(npc)
+
+    collected = state["collected"].tolist()
+    if full:
+        keep = set(collected)
+        current = set(collected_uids)
+        for uid in current - keep:
+            world_collectibles[uid].respawn()
+        for uid in keep - current:
+            world_collectibles[uid].collect()
+        collected_uids[:] = collected
+    else:
+        for uid in collected:
+            if not world_collectibles[uid].collected:
+                world_collectibles[uid].collect()
+
+    if full:
+        for tilemap in tilemaps.values():
+            tilemap.revert_edits()
+    for edit_maze, tile_x, tile_y, tile in state["edits"].tolist():
+        tilemaps[edit_maze].set_tile(tile_x, tile_y, chr(tile))
+
+    for fog_maze, explored in state["fog"].items():
+        if fog_maze in tilemaps:
+            tilemaps[fog_maze].fog.restore(explored)
+
+    camera.width = tilemaps[player.current_maze].width
+    camera.height = tilemaps[player.current_maze].height
+    quest_board = QuestBoard(player.inventory)
+    for npc in world_npcs:
+        quest_board.register(npc)
+    in_dialogue = False
+    current_npc = None
+
+def encode_record(kind, payload):
+    body = zlib.compress(payload, 1)
+    return SAVE_HEADER.pack(SAVE_MAGIC, SAVE_VERSION, kind, len(body)) + body
+
+def decode_records(data):
+    offset = 0
+    while offset + SAVE_HEADER.size <= len(data):
+        magic, version, kind, length = SAVE_HEADER.unpack_from(data, offset)
+        if magic != SAVE_MAGIC or not 1 <= version <= SAVE_VERSION:
+            raise ValueError(f"Unsupported save format {magic!r} v{version}")
+        offset += SAVE_HEADER.size
+        if offset + length > len(data):
+            break
+        yield kind, zlib.decompress(data[offset:offset + length])
+        offset += length
+
+class SaveStorage:
+    def __init__(self, directory):
+        self.directory = directory
+        self.web = sys.platform == "emscripten"
+        self.available = False
+
+    async def ready(self, timeout=2.0):
+        if self.web:
+            try:
+                import platform
+                platform.window.eval(IDBFS_MOUNT_JS % self.directory)
+                deadline = time.perf_counter() + timeout
+                while not platform.window.cat_save_ready and time.perf_counter() < deadline:
+                    await asyncio.sleep(0)
+            except Exception as e:
+                print(f"Persistent storage unavailable: {e}")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+        except OSError as e:
+            print(f"Saving disabled: {e}")
+            return False
+        self.available = True
+        return True
+
+    def flush(self):
+        if self.web:
+            try:
+                import platform
+                platform.window.eval("FS.syncfs(false, function(err) {});")
+            except Exception as e:
+                print(f"Could not sync saves: {e}")
+
+class SaveManager:
+    def __init__(self, storage):
+        self.storage = storage
+        self.base_path = os.path.join(storage.directory, "save.bin")
+        self.journal_path = os.path.join(storage.directory, "save.journal")
+        self.saved_npcs = None
+        self.saved_collected = 0
+        self.saved_edits = {}
+        self.saved_fog = {}
+        self.journal_records = 0
+
+    def edits_since(self, full):
+        rows = []
+        for maze, tilemap in tilemaps.items():
+            start = 0 if full else self.saved_edits.get(maze, 0)
+            rows.extend((maze, x, y, ord(char)) for x, y, char in tilemap.edits[start:])
+        return np.array(rows, dtype=EDIT_RECORD)
+
+    def mark_saved(self, npc_rows):
+        self.saved_npcs = npc_rows
+        self.saved_collected = len(collected_uids)
+        self.saved_edits = {maze: len(tilemap.edits) for maze, tilemap in tilemaps.items()}
+        self.saved_fog = {maze: tilemap.fog.revision for maze, tilemap in tilemaps.items()}
+
+    def fog_since(self, full):
+        return [maze for maze, tilemap in tilemaps.items()
+                if tilemap.fog.revision and (full or self.saved_fog.get(maze) != tilemap.fog.revision)]
+
+    def save(self):
+        npc_rows = npc_records()
+        record = encode_record(RECORD_BASE, encode_payload(npc_rows, collected_uids, self.edits_since(True), self.fog_since(True)))
+        temp_path = self.base_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(record)
+        os.replace(temp_path, self.base_path)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.journal_records = 0
+        self.mark_saved(npc_rows)
+        self.storage.flush()
+
+    def autosave(self):
+        if self.saved_npcs is None or self.journal_records >= AUTOSAVE_COMPACT_RECORDS:
+            self.save()
+            return
+        npc_rows = npc_records()
+        saved = len(self.saved_npcs)
+        changed = npc_rows[:saved] != self.saved_npcs
+        delta_npcs = np.concatenate([npc_rows[:saved][changed], npc_rows[saved:]])
+        payload = encode_payload(delta_npcs, collected_uids[self.saved_collected:], self.edits_since(False), self.fog_since(False))
+        with open(self.journal_path, "ab") as f:
+            f.write(encode_record(RECORD_DELTA, payload))
+        self.journal_records += 1
+        self.mark_saved(npc_rows)
+        self.storage.flush()
+
+    def load(self):
+        if not os.path.exists(self.base_path):
+            return False
+        with open(self.base_path, "rb") as f:
+            records = list(decode_records(f.read()))
+        if not records or records[0][0] != RECORD_BASE:
+            raise ValueError(f"{self.base_path} does not start with a full snapshot")
+        apply_payload(decode_payload(records[0][1]), True)
+
+        self.journal_records = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "rb") as f:
+                for kind, payload in decode_records(f.read()):
+                    apply_payload(decode_payload(payload), False)
+                    self.journal_records += 1
+        self.mark_saved(npc_records())
+        return True
+
+SESSION_STATE = tuple(create_world())
+
+class GameSession:
+    def __init__(self):
+        self.previous = None
+        namespace = globals()
+        active = {name: namespace[name] for name in SESSION_STATE}
+        self.state = create_world()
+        namespace.update(active)
+
+    def __enter__(self):
+        if self.previous is not None:
+            raise RuntimeError("GameSession is already active")
+        namespace = globals()
+        self.previous = {name: namespace[name] for name in SESSION_STATE}
+        namespace.update(self.state)
+        return self
+
+    def __exit__(self, *exc_info):
+        namespace = globals()
+        self.state = {name: namespace[name] for name in SESSION_STATE}
+        namespace.update(self.previous)
+        self.previous = None
+
+    @property
+    def tick_count(self):
+        return self.state["tick_count"]
+
+    def run(self, ticks, input_replay=None):
+        with self:
+            run_headless(ticks, input_replay)
+
+    def summary(self):
+        state = self.state
+        return {
+            "ticks": state["tick_count"],
+            "maze": state["player"].current_maze,
+            "position": tuple(state["player"].rect.topleft),
+            "inventory": dict(state["player"].inventory),
+            "quests": sorted(npc.npc_type for npc in state["world_npcs"] if npc.quest_complete),
+            "collected": len(state["collected_uids"])
+        }
+
+def load_game():
+    if not save_manager.storage.available:
+        return False
+    try:
+        return save_manager.load()
+    except (OSError, ValueError, struct.error, zlib.error) as e:
+        print(f"Could not load save: {e}")
+        return False
+
+def save_game():
+    if not save_manager.storage.available:
+        return False
+    try:
+        save_manager.save()
+    except OSError as e:
+        print(f"Could not save: {e}")
+        return False
+    return True
+
+def autosave_game():
+    if not save_manager.storage.available:
+        return False
+    try:
+        save_manager.autosave()
+    except OSError as e:
+        print(f"Could not autosave: {e}")
+        return False
+    return True
+
+recorder = InputRecorder() if RECORD_INPUT else None
+replay = InputReplay.load(REPLAY_INPUT) if REPLAY_INPUT else None
+
+def quit_game():
+    if recorder is not None:
+        recorder.save(RECORD_INPUT, tick_count)
+    if PROFILE_OUTPUT:
+        profiler.export(PROFILE_OUTPUT)
+    if SAVE_ENABLED:
+        save_game()
+    pygame.quit()
+    sys.exit()
+
+def handle_event(event):
+    global in_dialogue, selected_option, current_npc
+    if event.type == pygame.QUIT:
+        quit_game()
+
+    if event.type == pygame.KEYUP:
+        held_keys.discard(event.key)
+    elif event.type == pygame.KEYDOWN:
+        held_keys.add(event.key)
+        if event.key == pygame.K_ESCAPE:
+            quit_game()
+        elif event.key == pygame.K_F3:
+            profiler.toggle()
+        elif event.key == pygame.K_F5 and SAVE_ENABLED:
+            save_game()
+        elif event.key == pygame.K_F9 and SAVE_ENABLED:
+            load_game()
+        elif event.key == pygame.K_e:
+            nearby = player.rect.inflate(TILE_SIZE*2, TILE_SIZE*2)
+            for npc in tilemaps[player.current_maze].npcs.query(nearby):
+                if npc.interact(player.rect):
+                    in_dialogue = True
+                    selected_option = 0
+                    current_npc = npc
+                    break
+        elif in_dialogue:
+            handle_dialogue(event.key)
+
+def update(dt):
+    global tick_count
+    tick_count += 1
+    player.previous = player.rect.topleft
+    if not in_dialogue:
+        dx, dy = 0, 0
+        step = round(PLAYER_SPEED * dt)
+        
+        if pygame.K_LEFT in held_keys or pygame.K_a in held_keys:
+            dx = -step
+            player.facing_left = True
+        if pygame.K_RIGHT in held_keys or pygame.K_d in held_keys:
+            dx = step
+            player.facing_left = False
+        if pygame.K_UP in held_keys or pygame.K_w in held_keys:
+            dy = -step
+        if pygame.K_DOWN in held_keys or pygame.K_s in held_keys:
+            dy = step
+
+        player.sprite.play("walk" if dx != 0 or dy != 0 else "idle")
+        player.sprite.update(dt)
+        player.portal_cooldown = max(0.0, player.portal_cooldown - dt)
+
+        if dx != 0 or dy != 0:
+            new_rect = player.rect.copy()
+            new_rect.x += dx
+            new_rect.y += dy
+            
+            with profiler.section("collision"):
+                blocked = check_collision(new_rect, player.current_maze)
+            if not blocked:
+                player.rect = new_rect
+                for npc in tilemaps[player.current_maze].npcs.query(player.rect):
+                    npc.knock_back(dx, dy)
+                
+                with profiler.section("portal"):
+                    entered_portal = player.portal_cooldown == 0 and check_portal(player.rect, player.current_maze)
+                if entered_portal:
+                    portal_effect(player.rect, player.current_maze)
+                    player.current_maze, spawn_x, spawn_y = portal_links[player.current_maze]
+                    player.rect.x = spawn_x * TILE_SIZE
+                    player.rect.y = spawn_y * TILE_SIZE
+                    player.previous = player.rect.topleft
+                    portal_effect(player.rect, player.current_maze)
+                    
+                    camera.width = tilemaps[player.current_maze].width
+                    camera.height = tilemaps[player.current_maze].height
+                    player.portal_cooldown = PORTAL_COOLDOWN
+
+        if FOG_OF_WAR:
+            with profiler.section("fog"):
+                tilemaps[player.current_maze].fog.update((player.rect.centerx // TILE_SIZE, player.rect.centery // TILE_SIZE))
+
+        with profiler.section("npcs"):
+            update_npcs(tilemaps[player.current_maze], dt)
+        with profiler.section("entities"):
+            update_entities(dt)
+
+    with profiler.section("pickup"):
+        tilemap = tilemaps[player.current_maze]
+        for collectible in tilemap.collectibles.query(player.rect):
+            player.inventory[collectible.item_type] += 1
+            quest_board.item_changed(collectible.item_type)
+            pickup_effect(collectible)
+            collectible.collect()
+
+    with profiler.section("particles"):
+        particles.update(dt)
+
+def update_npcs(tilemap, dt):
+    area = pygame.Rect(0, 0, SCREEN_WIDTH + NPC_SIM_MARGIN*2, SCREEN_HEIGHT + NPC_SIM_MARGIN*2)
+    area.center = player.rect.center
+    player_tile = (player.rect.centerx // TILE_SIZE, player.rect.centery // TILE_SIZE)
+    for npc in tilemap.npcs.query(area):
+        if npc.behavior != "idle":
+            npc.update(dt, tilemap.pathfinder, player_tile)
+
+def update_entities(dt):
+    for index in entities.step(dt):
+        entity = entities.objects[index]
+        getattr(tilemaps[entity.maze_number], entity.index_name).move(entity)
+
+def run_headless(ticks, input_replay=None):
+    for _ in range(ticks):
+        if input_replay is not None:
+            with profiler.section("input"):
+                for event in input_replay.events_for(tick_count):
+                    handle_event(event)
+        with profiler.section("update"):
+            update(TICK)
+        profiler.end_frame()
 
 async def main():
     global in_dialogue, selected_option, current_npc
@@ -408,108 +2189,69 @@ async def main():
     selected_option = 0
     current_npc = None
 
+    if HEADLESS:
+        ticks = replay.ticks if replay is not None else HEADLESS_TICKS
+        start = time.perf_counter()
+        run_headless(ticks, replay)
+        elapsed = time.perf_counter() - start
+        print(f"{ticks} ticks in {elapsed:.3f}s ({ticks / max(elapsed, 1e-9):.0f} ticks/s)")
+        quit_game()
+
+    render(tilemaps[player.current_maze])
+    if STARTUP_BENCH:
+        print(json.dumps({"first_frame": time.time()}), flush=True)
+
+    if SAVE_ENABLED and await save_manager.storage.ready():
+        load_game()
+
+    previous_time = time.perf_counter()
+    accumulator = 0.0
+    autosave_timer = 0.0
     while True:
         await asyncio.sleep(0)
         
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE:
-                    pygame.quit()
-                    sys.exit()
-                elif event.key == pygame.K_e:
-                    for npc in npcs:
-                        if npc.maze_number == player.current_maze and npc.interact(player.inventory):
-                            in_dialogue = True
-                            selected_option = 0
-                            current_npc = npc
-                            break
-                elif in_dialogue:
-                    handle_dialogue(event.key)
-
-        if not in_dialogue:
-            dx, dy = 0, 0
-            keys = pygame.key.get_pressed()
-            
-            if keys[pygame.K_LEFT] or keys[pygame.K_a]:
-                dx = -PLAYER_SPEED
-                player.facing_left = True
-            if keys[pygame.K_RIGHT] or keys[pygame.K_d]:
-                dx = PLAYER_SPEED
-                player.facing_left = False
-            if keys[pygame.K_UP] or keys[pygame.K_w]:
-                dy = -PLAYER_SPEED
-            if keys[pygame.K_DOWN] or keys[pygame.K_s]:
-                dy = PLAYER_SPEED
-
-            if dx != 0 or dy != 0:
-                player.anim_timer += 1
-                if player.anim_timer % 10 == 0:
-                    player.anim_index = 2 if player.anim_index == 1 else 1
-            else:
-                player.anim_index = 0
+        now = time.perf_counter()
+        frame_time = min(now - previous_time, MAX_FRAME_TIME)
+        accumulator += frame_time
+        previous_time = now
 
-            if player.portal_cooldown > 0:
-                player.portal_cooldown -= 1
+        with profiler.section("input"):
+            for event in pygame.event.get():
+                if replay is not None and event.type in (pygame.KEYDOWN, pygame.KEYUP) and event.key != pygame.K_ESCAPE:
+                    continue
+                if recorder is not None:
+                    recorder.record(tick_count, event)
+                handle_event(event)
 
-            if dx != 0 or dy != 0:
-                new_rect = player.rect.copy()
-                new_rect.x += dx
-                new_rect.y += dy
-                
-                if not check_collision(new_rect, player.current_maze):
-                    player.rect = new_rect
-                    
-                    if player.portal_cooldown == 0 and check_portal(player.rect, player.current_maze):
-                        player.current_maze = 2 if player.current_maze == 1 else 1
-                        
-                        if player.current_maze == 1:
-                            player.rect.x = 20 * TILE_SIZE
-                            player.rect.y = 10 * TILE_SIZE
-                        else:
-                            player.rect.x = 1 * TILE_SIZE
-                            player.rect.y = 5 * TILE_SIZE
-                        
-                        current_maze = MAZE2 if player.current_maze == 2 else MAZE1
-                        camera.width = len(current_maze[0]) * TILE_SIZE
-                        camera.height = len(current_maze) * TILE_SIZE
-                        player.portal_cooldown = 60
-
-        camera.update(player)
-
-        for collectible in collectibles[:]:
-            if collectible.maze_number == player.current_maze and player.rect.colliderect(collectible.rect):
-                player.inventory[collectible.item_type] += 1
-                collectibles.remove(collectible)
-
-        screen.fill(BLACK)
-        
-        current_maze = MAZE2 if player.current_maze == 2 else MAZE1
-        for y, row in enumerate(current_maze):
-            for x, char in enumerate(row):
-                if char in tile_images:
-                    tile_rect = pygame.Rect(x*TILE_SIZE, y*TILE_SIZE, TILE_SIZE, TILE_SIZE)
-                    screen.blit(tile_images[char], camera.apply(pygame.Rect(tile_rect)).topleft)
-        
-        for collectible in collectibles:
-            if collectible.maze_number == player.current_maze:
-                screen.blit(collectible.image, camera.apply(collectible).topleft)
-        
-        for npc in npcs:
-            if npc.maze_number == player.current_maze:
-                screen.blit(npc.image, camera.apply(npc).topleft)
-        
-        player.draw(screen, camera)
-        
-        draw_inventory()
-        if in_dialogue:
-            draw_dialogue()
+        while accumulator >= TICK:
+            if replay is not None:
+                for event in replay.events_for(tick_count):
+                    handle_event(event)
+            with profiler.section("update"):
+                update(TICK)
+            accumulator -= TICK
 
-        pygame.display.flip()
-        clock.tick(60)
+        with profiler.section("streaming"):
+            stream_levels()
+            if asset_tasks:
+                asset_tasks.run(TASK_BUDGET)
+            else:
+                level_tasks.run(TASK_BUDGET)
+        if STARTUP_BENCH and not asset_tasks:
+            print(json.dumps({"assets_loaded": time.time()}), flush=True)
+            quit_game()
+
+        if SAVE_ENABLED:
+            autosave_timer += frame_time
+            if autosave_timer >= AUTOSAVE_INTERVAL:
+                with profiler.section("autosave"):
+                    autosave_game()
+                autosave_timer = 0.0
+
+        render(tilemaps[player.current_maze], accumulator / TICK)
+        profiler.end_frame()
+        clock.tick(FPS)
 
-os.environ['SDL_VIDEO_CENTERED'] = '1'
-asyncio.run(main())
\ No newline at end of file
+if __name__ == "__main__":
+    os.environ['SDL_VIDEO_CENTERED'] = '1'
+    asyncio.run(main())
\ No newline at end of file